@@ -0,0 +1,245 @@
+"""
+Adaptive admission control and request deadlines
+
+Every request is put in a route class (health, auth, write, read, bulk).
+A shared AIMD concurrency limit covers all database-backed work: it creeps
+up while requests finish within their class's latency target and backs off
+multiplicatively when they do not. Each class may only use its share of the
+limit, so once the limit adapts down low-priority work (bulk, then catalog
+reads) is shed first with a fast 503 and ``Retry-After``; health checks are
+never shed.
+
+Each admitted request also gets a deadline. It is pushed into the database
+as a statement timeout (``SET LOCAL statement_timeout`` once per
+transaction on PostgreSQL, a progress handler on SQLite) so a slow database cannot pin a worker forever.
+Routes that stream their body call :meth:`AdmissionController.detach`
+before returning, so the download is neither counted against the limit
+nor cut off half-way by the deadline.
+"""
+import math
+import threading
+import time
+
+from flask import g, has_request_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_CLASSES = {
+    # share: fraction of the shared limit the class may occupy
+    'health': {'share': None, 'target_latency': 0.5, 'deadline': 1.0},
+    'auth': {'share': 1.0, 'target_latency': 1.0, 'deadline': 5.0},
+    'write': {'share': 1.0, 'target_latency': 0.5, 'deadline': 5.0},
+    'read': {'share': 0.8, 'target_latency': 0.3, 'deadline': 3.0},
+    'bulk': {'share': 0.4, 'target_latency': 2.0, 'deadline': 30.0}
+}
+
+DEFAULT_ROUTE_CLASSES = {
+    'health_check': 'health',
+    'login': 'auth',
+    'register': 'auth',
+    'batch': 'bulk',
+    'export_snapshot': 'bulk'
+}
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request runs past its deadline"""
+
+
+class AdaptiveLimit:
+    """Shared AIMD concurrency limit"""
+
+    def __init__(self, initial=32, minimum=4, maximum=256, backoff=0.8):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def try_acquire(self, share):
+        with self._lock:
+            if self.in_flight >= max(self.limit * share, 1):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency, target_latency):
+        with self._lock:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if latency > target_latency:
+                # Back off at most once per target window so one burst of
+                # slow requests does not collapse the limit to the floor
+                if now - self._last_decrease >= target_latency:
+                    self.limit = max(self.minimum, self.limit * self.backoff)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+
+class ClassStats:
+    """In-flight count and smoothed latency of one route class"""
+
+    def __init__(self, smoothing=0.2):
+        self.smoothing = smoothing
+        self.in_flight = 0
+        self.latency = None
+        self.shed = 0
+        self._lock = threading.Lock()
+
+    def started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self, latency):
+        with self._lock:
+            self.in_flight -= 1
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += self.smoothing * (latency - self.latency)
+
+    def rejected(self):
+        with self._lock:
+            self.shed += 1
+
+
+class AdmissionController:
+    """Flask extension wiring the limiter, deadlines and 503 responses"""
+
+    def __init__(self, app=None):
+        self.limit = None
+        self.classes = {}
+        self.route_classes = {}
+        self.stats = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('ADMISSION_CONTROL_ENABLED', True)
+        self.limit = AdaptiveLimit(
+            initial=app.config.get('ADMISSION_INITIAL_LIMIT', 32),
+            minimum=app.config.get('ADMISSION_MIN_LIMIT', 4),
+            maximum=app.config.get('ADMISSION_MAX_LIMIT', 256)
+        )
+        self.classes = {
+            name: dict(settings, **app.config.get('ADMISSION_CLASSES', {}).get(name, {}))
+            for name, settings in DEFAULT_CLASSES.items()
+        }
+        self.route_classes = dict(DEFAULT_ROUTE_CLASSES, **app.config.get('ADMISSION_ROUTE_CLASSES', {}))
+        self.stats = {name: ClassStats() for name in self.classes}
+
+        app.before_request(self.admit)
+        app.after_request(self.map_deadline_errors)
+        app.teardown_request(self.finish)
+        app.register_error_handler(DeadlineExceeded, self.deadline_response)
+        event.listen(Engine, 'before_cursor_execute', apply_statement_deadline)
+
+    def classify(self):
+        route_class = self.route_classes.get(request.endpoint)
+        if route_class:
+            return route_class
+        return 'read' if request.method in ('GET', 'HEAD') else 'write'
+
+    def admit(self):
+        # Sub-requests of /api/batch share the outer request's slot and deadline
+        if not self.enabled or request.method == 'OPTIONS' or 'admission' in g:
+            return None
+
+        route_class = self.classify()
+        settings = self.classes[route_class]
+        share = settings['share']
+        if share is not None and not self.limit.try_acquire(share):
+            self.stats[route_class].rejected()
+            return self.overloaded_response(route_class)
+
+        self.stats[route_class].started()
+        g.admission = {
+            'request': request._get_current_object(),
+            'class': route_class,
+            'started': time.monotonic(),
+            'acquired': share is not None,
+            'expired': False
+        }
+        g.deadline = time.monotonic() + settings['deadline']
+        return None
+
+    def finish(self, error=None):
+        admission = g.get('admission')
+        if admission is None or admission['request'] is not request._get_current_object():
+            return
+        g.pop('admission')
+        g.pop('deadline', None)
+        latency = time.monotonic() - admission['started']
+        settings = self.classes[admission['class']]
+        self.stats[admission['class']].finished(latency)
+        if admission['acquired']:
+            self.limit.release(latency, settings['target_latency'])
+
+    def detach(self):
+        """Release the current request's slot and drop its deadline now.
+
+        For streamed responses: once the body is being sent the client has
+        its 200, so a deadline could only truncate the stream.
+        """
+        self.finish()
+
+    def retry_after(self, route_class):
+        latency = self.stats[route_class].latency or self.classes[route_class]['target_latency']
+        return max(1, math.ceil(latency * 2))
+
+    def overloaded_response(self, route_class):
+        response = jsonify({'error': 'Server is overloaded, please retry shortly'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(self.retry_after(route_class))
+        return response
+
+    def deadline_response(self, error):
+        admission = g.get('admission')
+        return self.overloaded_response(admission['class'] if admission else 'read')
+
+    def map_deadline_errors(self, response):
+        # Routes catch database errors themselves and answer 500; when the
+        # cause was our own deadline, tell the client to retry instead
+        admission = g.get('admission')
+        if admission and admission['expired'] and response.status_code == 500:
+            return self.overloaded_response(admission['class'])
+        return response
+
+
+def _deadline_passed():
+    admission = g.get('admission')
+    if admission is not None:
+        admission['expired'] = True
+    return 1
+
+
+def apply_statement_deadline(conn, cursor, statement, parameters, context, executemany):
+    """Propagate the request deadline into the database as a statement timeout"""
+    dialect = conn.dialect.name
+    deadline = g.get('deadline') if has_request_context() else None
+
+    if deadline is None:
+        if dialect == 'sqlite':
+            cursor.connection.set_progress_handler(None, 0)
+        return
+
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        _deadline_passed()
+        raise DeadlineExceeded('Request deadline exceeded')
+
+    if dialect == 'sqlite':
+        cursor.connection.set_progress_handler(
+            lambda: _deadline_passed() if time.monotonic() > deadline else 0, 10000
+        )
+    elif dialect == 'postgresql':
+        # SET LOCAL holds until the transaction ends, so send it once per
+        # transaction and again only after half of that budget has gone
+        transaction = conn.get_transaction()
+        applied = conn.info.get('statement_deadline')
+        if applied is None or applied[0] is not transaction or remaining < applied[1] / 2:
+            cursor.execute('SET LOCAL statement_timeout = %d' % max(1, int(remaining * 1000)))
+            conn.info['statement_deadline'] = (transaction, remaining)
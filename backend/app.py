@@ -1,25 +1,44 @@
 # SuperMall Backend API
-from flask import Flask, request, jsonify
+import click
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager, jwt_required, create_access_token, get_jwt_identity
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
+from sqlalchemy import and_, func, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.hybrid import hybrid_property
 import os
 
+from admission import AdmissionController
+from compression import ResponseCompressor
+from config import Config, config
+from group_commit import ReviewGroupCommitter, ShopNotFound
+from offer_events import OfferEventBroker, SubscriberLimitReached
+from offer_scheduler import OfferScheduler
+import opening_hours
+from rate_limit import RateLimiter
+import schema_upgrade
+import similar_products
+import snapshot_export
+from serializers import ModelSerializer, OrjsonProvider
+import tag_index
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
-# Configuration
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-here')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///supermall.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'jwt-secret-string')
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
+# Configuration (every setting lives in config.py). The extensions below read
+# it once, so the class is chosen here from FLASK_ENV and never swapped later
+app.config.from_object(config[os.environ['FLASK_ENV']] if os.environ.get('FLASK_ENV') else Config)
 
 # Initialize extensions
 db = SQLAlchemy(app)
 jwt = JWTManager(app)
 CORS(app, origins=["http://localhost:5173", "http://localhost:3000"])
+ResponseCompressor(app)
+RateLimiter(app)
+admission_control = AdmissionController(app)
 
 # Database Models
 class User(db.Model):
@@ -65,6 +84,7 @@ class Shop(db.Model):
     email = db.Column(db.String(120))
     website = db.Column(db.String(200))
     image_url = db.Column(db.String(500))
+    opening_hours = db.Column(db.JSON)  # Compiled into shop_hours on write
     owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     rating = db.Column(db.Float, default=0.0)
     total_reviews = db.Column(db.Integer, default=0)
@@ -91,6 +111,7 @@ class Shop(db.Model):
             'email': self.email,
             'website': self.website,
             'image_url': self.image_url,
+            'opening_hours': self.opening_hours,
             'rating': self.rating,
             'total_reviews': self.total_reviews,
             'is_active': self.is_active,
@@ -99,6 +120,20 @@ class Shop(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+class ShopHours(db.Model):
+    __tablename__ = 'shop_hours'
+
+    id = db.Column(db.Integer, primary_key=True)
+    shop_id = db.Column(db.Integer, db.ForeignKey('shops.id', ondelete='CASCADE'), nullable=False, index=True)
+    start_slot = db.Column(db.Integer, nullable=False)  # 15-minute slot of the week, Monday 00:00 = 0
+    end_slot = db.Column(db.Integer, nullable=False)  # exclusive
+
+    __table_args__ = (db.Index('ix_shop_hours_slots', 'start_slot', 'end_slot'),)
+
+opening_hours.register(Shop, ShopHours)
+# Resolved once so a bad SHOP_TIMEZONE fails at startup, not on every request
+shop_timezone = opening_hours.load_timezone(app.config['SHOP_TIMEZONE'])
+
 class Product(db.Model):
     __tablename__ = 'products'
     
@@ -107,9 +142,14 @@ class Product(db.Model):
     description = db.Column(db.Text)
     price = db.Column(db.Float, nullable=False)
     category = db.Column(db.String(50), nullable=False)
+    subcategory = db.Column(db.String(50))
+    sku = db.Column(db.String(50), unique=True)
+    brand = db.Column(db.String(50))
     shop_id = db.Column(db.Integer, db.ForeignKey('shops.id'), nullable=False)
     image_url = db.Column(db.String(500))
     stock_quantity = db.Column(db.Integer, default=0)
+    low_stock_threshold = db.Column(db.Integer, default=10)
+    tags = db.Column(db.JSON)  # Store as JSON array, indexed in product_tags
     is_available = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -121,13 +161,68 @@ class Product(db.Model):
             'description': self.description,
             'price': self.price,
             'category': self.category,
+            'subcategory': self.subcategory,
+            'sku': self.sku,
+            'brand': self.brand,
             'shop_id': self.shop_id,
             'image_url': self.image_url,
             'stock_quantity': self.stock_quantity,
+            'low_stock_threshold': self.low_stock_threshold,
+            'tags': self.tags,
             'is_available': self.is_available,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+    # Same comparison on instances and in SQL (?in_stock= / ?low_stock=)
+    @hybrid_property
+    def is_in_stock(self):
+        return self.stock_quantity > 0
+
+    @hybrid_property
+    def is_low_stock(self):
+        return self.stock_quantity <= self.low_stock_threshold
+
+# Partial indexes matching the hybrid filters
+_available_in_stock = and_(Product.is_available == True, Product.is_in_stock)  # noqa: E712
+db.Index(
+    'ix_products_in_stock', Product.category, Product.shop_id,
+    postgresql_where=_available_in_stock, sqlite_where=_available_in_stock
+)
+db.Index(
+    'ix_products_low_stock', Product.shop_id,
+    postgresql_where=Product.is_low_stock, sqlite_where=Product.is_low_stock
+)
+
+class ProductTag(db.Model):
+    __tablename__ = 'product_tags'
+
+    tag = db.Column(db.String(50), primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True, index=True)
+
+class TagCount(db.Model):
+    __tablename__ = 'tag_counts'
+
+    tag = db.Column(db.String(50), primary_key=True)
+    product_count = db.Column(db.Integer, nullable=False, default=0)
+
+tag_index.register(Product, ProductTag, TagCount)
+
+class ProductSimilarity(db.Model):
+    __tablename__ = 'product_similarities'
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    similar_product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+class SimilarityRun(db.Model):
+    __tablename__ = 'similarity_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, nullable=False, index=True)
+    finished_at = db.Column(db.DateTime)
+    products_updated = db.Column(db.Integer, default=0)
+
 class Offer(db.Model):
     __tablename__ = 'offers'
     
@@ -141,11 +236,38 @@ class Offer(db.Model):
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=True)
     start_date = db.Column(db.DateTime, nullable=False)
     end_date = db.Column(db.DateTime, nullable=False)
+    usage_limit = db.Column(db.Integer)
+    used_count = db.Column(db.Integer, default=0)
     is_active = db.Column(db.Boolean, default=True)
+    status = db.Column(db.String(20), default='scheduled', index=True)  # inactive, scheduled, live, exhausted, expired
     image_url = db.Column(db.String(500))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    def compute_status(self, now=None):
+        now = now or datetime.utcnow()
+        if self.is_active is False:  # None until the column default is applied
+            return 'inactive'
+        if now < self.start_date:
+            return 'scheduled'
+        if now > self.end_date:
+            return 'expired'
+        if self.usage_limit is not None and (self.used_count or 0) >= self.usage_limit:
+            return 'exhausted'
+        return 'live'
+
+    @hybrid_property
+    def is_valid(self):
+        if self.status is None:
+            return self.compute_status() == 'live'
+        return self.status == 'live' and self.end_date >= datetime.utcnow()
+
+    @is_valid.expression
+    def is_valid(cls):
+        # The scheduler keeps status current; the end_date guard keeps
+        # expired offers out of listings while no scheduler is running
+        return and_(cls.status == 'live', cls.end_date >= datetime.utcnow())
+
     def to_dict(self):
         shop = Shop.query.get(self.shop_id)
         return {
@@ -161,10 +283,28 @@ class Offer(db.Model):
             'start_date': self.start_date.isoformat(),
             'end_date': self.end_date.isoformat(),
             'is_active': self.is_active,
+            'status': self.status,
             'image_url': self.image_url,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+# Live offers per shop, in expiry order
+db.Index(
+    'ix_offers_live', Offer.shop_id, Offer.end_date,
+    postgresql_where=Offer.status == 'live', sqlite_where=Offer.status == 'live'
+)
+
+class OfferRedemption(db.Model):
+    __tablename__ = 'offer_redemptions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    offer_id = db.Column(db.Integer, db.ForeignKey('offers.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    redeemed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # One redemption per user and offer, enforced by the database
+    __table_args__ = (db.UniqueConstraint('offer_id', 'user_id', name='uq_offer_redemptions_offer_user'),)
+
 class Review(db.Model):
     __tablename__ = 'reviews'
     
@@ -174,6 +314,7 @@ class Review(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     shop_id = db.Column(db.Integer, db.ForeignKey('shops.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def to_dict(self):
         return {
@@ -185,6 +326,96 @@ class Review(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+# Row serializers for list routes, generated from the column metadata
+# (each matches the model's to_dict)
+SHOP_SERIALIZER = ModelSerializer(Shop, exclude=('owner_id', 'updated_at'))
+PRODUCT_SERIALIZER = ModelSerializer(Product, exclude=('updated_at',))
+OFFER_SERIALIZER = ModelSerializer(
+    Offer, exclude=('usage_limit', 'used_count', 'updated_at'),
+    extra={'shop_name': func.coalesce(Shop.name, '')}
+)
+REVIEW_SERIALIZER = ModelSerializer(Review, exclude=('updated_at',))
+
+# Offer lifecycle scheduler
+offer_scheduler = OfferScheduler(
+    app, db, Offer,
+    tick_seconds=app.config['OFFER_SCHEDULER_TICK_SECONDS']
+)
+
+@app.before_request
+def start_offer_scheduler():
+    if app.config['OFFER_SCHEDULER_ENABLED']:
+        offer_scheduler.start()
+
+# Live offer events for GET /api/offers/stream
+offer_events = OfferEventBroker(
+    buffer_size=app.config['OFFER_STREAM_BUFFER_SIZE'],
+    max_subscribers=app.config['OFFER_STREAM_MAX_SUBSCRIBERS']
+)
+
+def publish_offer_event(event_type, data):
+    """Publish an offer event, routed by the offer's shop and shop category"""
+    category = db.session.query(Shop.category).filter(Shop.id == data['shop_id']).scalar()
+    offer_events.publish(event_type, data, shop_id=data['shop_id'], category=category)
+
+@offer_scheduler.subscribe
+def publish_offer_status(event):
+    publish_offer_event('status', event)
+
+# Opt-in group commit for review bursts
+review_committer = ReviewGroupCommitter(
+    app, db, Review, Shop,
+    window=app.config['REVIEW_GROUP_COMMIT_WINDOW_MS'] / 1000.0,
+    max_batch=app.config['REVIEW_GROUP_COMMIT_MAX_BATCH']
+)
+
+def validate_product_delta(item):
+    """Validate one bulk update item; returns (changes, error)"""
+    if not isinstance(item, dict):
+        return None, 'Item must be an object'
+    if item.get('id') is None and not item.get('sku'):
+        return None, 'id or sku is required'
+    if item.get('id') is not None and (isinstance(item['id'], bool) or not isinstance(item['id'], int)):
+        return None, 'id must be an integer'
+    if item.get('sku') is not None and not isinstance(item['sku'], str):
+        return None, 'sku must be a string'
+    
+    changes = {}
+    if 'price' in item:
+        if isinstance(item['price'], bool) or not isinstance(item['price'], (int, float)) or item['price'] < 0:
+            return None, 'price must be a non-negative number'
+        changes['price'] = item['price']
+    if 'stock_quantity' in item:
+        if isinstance(item['stock_quantity'], bool) or not isinstance(item['stock_quantity'], int) or item['stock_quantity'] < 0:
+            return None, 'stock_quantity must be a non-negative integer'
+        changes['stock_quantity'] = item['stock_quantity']
+    if 'is_available' in item:
+        if not isinstance(item['is_available'], bool):
+            return None, 'is_available must be a boolean'
+        changes['is_available'] = item['is_available']
+    
+    if not changes:
+        return None, 'Nothing to update (price, stock_quantity or is_available)'
+    return changes, None
+
+def parse_flag(name):
+    """Read a boolean query parameter; None when it is absent"""
+    value = request.args.get(name, '').lower()
+    if not value:
+        return None
+    if value in ('1', 'true'):
+        return True
+    if value in ('0', 'false'):
+        return False
+    raise ValueError(f'{name} must be 1/true or 0/false')
+
+def parse_datetime(value):
+    """Parse an ISO 8601 string into a naive UTC datetime"""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
 # Authentication Routes
 @app.route('/api/auth/register', methods=['POST'])
 def register():
@@ -256,9 +487,21 @@ def login():
 @app.route('/api/shops', methods=['GET'])
 def get_shops():
     try:
-        shops = Shop.query.filter_by(is_active=True).all()
+        try:
+            open_slot = opening_hours.requested_slot(
+                request.args.get('open_at'), parse_flag('open_now'), shop_timezone
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        query = Shop.query.filter_by(is_active=True)
+        
+        if open_slot is not None:
+            query = opening_hours.filter_open_at(query, Shop, ShopHours, open_slot)
+        
+        shops = query.with_entities(*SHOP_SERIALIZER.columns).all()
         return jsonify({
-            'shops': [shop.to_dict() for shop in shops]
+            'shops': SHOP_SERIALIZER.serialize(shops)
         }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -276,6 +519,11 @@ def create_shop():
             if field not in data:
                 return jsonify({'error': f'{field} is required'}), 400
         
+        try:
+            opening_hours.compile_hours(data.get('opening_hours'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         # Create new shop
         shop = Shop(
             name=data['name'],
@@ -287,6 +535,7 @@ def create_shop():
             email=data.get('email', ''),
             website=data.get('website', ''),
             image_url=data.get('image_url', ''),
+            opening_hours=data.get('opening_hours'),
             owner_id=current_user_id,
             latitude=data.get('latitude'),
             longitude=data.get('longitude')
@@ -312,12 +561,75 @@ def get_shop(shop_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/shops/<int:shop_id>/page', methods=['GET'])
+def get_shop_page(shop_id):
+    """Everything a shop page renders, in a fixed number of queries"""
+    try:
+        shop = db.session.get(Shop, shop_id)
+        if shop is None:
+            return jsonify({'error': 'Shop not found'}), 404
+        
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 20, type=int)
+        products = Product.query.filter_by(
+            shop_id=shop_id, is_available=True
+        ).order_by(Product.id).paginate(
+            page=page, per_page=per_page, max_per_page=100, error_out=False
+        )
+        
+        # Offer.to_dict looks the shop up by id, which the identity map already holds
+        offers = Offer.query.filter(
+            Offer.shop_id == shop_id,
+            Offer.is_valid
+        ).order_by(Offer.end_date).all()
+        
+        distribution = dict(
+            db.session.query(Review.rating, func.count(Review.id))
+            .filter(Review.shop_id == shop_id)
+            .group_by(Review.rating)
+            .all()
+        )
+        total_reviews = sum(distribution.values())
+        recent_reviews = Review.query.filter_by(shop_id=shop_id).order_by(
+            Review.created_at.desc()
+        ).limit(5).with_entities(*REVIEW_SERIALIZER.columns).all()
+        
+        return jsonify({
+            'shop': shop.to_dict(),
+            'products': [product.to_dict() for product in products.items],
+            'pagination': {
+                'page': products.page,
+                'per_page': products.per_page,
+                'total': products.total,
+                'pages': products.pages
+            },
+            'offers': [offer.to_dict() for offer in offers],
+            'reviews': {
+                'total': total_reviews,
+                'average': (
+                    sum(rating * count for rating, count in distribution.items()) / total_reviews
+                    if total_reviews else 0.0
+                ),
+                'distribution': {str(rating): distribution.get(rating, 0) for rating in range(1, 6)},
+                'recent': REVIEW_SERIALIZER.serialize(recent_reviews)
+            }
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # Product Routes
 @app.route('/api/products', methods=['GET'])
 def get_products():
     try:
         shop_id = request.args.get('shop_id')
         category = request.args.get('category')
+        try:
+            tags, tag_mode = tag_index.parse_tag_args(request.args)
+            in_stock = parse_flag('in_stock')
+            low_stock = parse_flag('low_stock')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         query = Product.query.filter_by(is_available=True)
         
@@ -327,10 +639,19 @@ def get_products():
         if category:
             query = query.filter_by(category=category)
         
-        products = query.all()
+        if in_stock is not None:
+            query = query.filter(Product.is_in_stock if in_stock else ~Product.is_in_stock)
+        
+        if low_stock is not None:
+            query = query.filter(Product.is_low_stock if low_stock else ~Product.is_low_stock)
+        
+        if tags:
+            query = tag_index.filter_by_tags(query, db.session, Product, ProductTag, TagCount, tags, tag_mode)
+        
+        products = query.with_entities(*PRODUCT_SERIALIZER.columns).all()
         
         return jsonify({
-            'products': [product.to_dict() for product in products]
+            'products': PRODUCT_SERIALIZER.serialize(products)
         }), 200
         
     except Exception as e:
@@ -349,6 +670,11 @@ def create_product():
             if field not in data:
                 return jsonify({'error': f'{field} is required'}), 400
         
+        try:
+            tags = tag_index.validate_tags(data.get('tags'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         # Verify shop ownership
         shop = Shop.query.get_or_404(data['shop_id'])
         if shop.owner_id != current_user_id:
@@ -360,9 +686,14 @@ def create_product():
             description=data.get('description', ''),
             price=data['price'],
             category=data['category'],
+            subcategory=data.get('subcategory'),
+            sku=data.get('sku'),
+            brand=data.get('brand'),
             shop_id=data['shop_id'],
             image_url=data.get('image_url', ''),
-            stock_quantity=data.get('stock_quantity', 0)
+            stock_quantity=data.get('stock_quantity', 0),
+            low_stock_threshold=data.get('low_stock_threshold', 10),
+            tags=tags
         )
         
         db.session.add(product)
@@ -377,19 +708,137 @@ def create_product():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/shops/<int:shop_id>/products', methods=['PATCH'])
+@jwt_required()
+def bulk_update_products(shop_id):
+    """Apply price / stock / availability deltas to many products at once"""
+    try:
+        current_user_id = get_jwt_identity()
+        data = request.get_json()
+        items = data.get('products') if isinstance(data, dict) else None
+        
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'products is required'}), 400
+        if len(items) > app.config['BULK_UPDATE_MAX_ITEMS']:
+            return jsonify({'error': f"At most {app.config['BULK_UPDATE_MAX_ITEMS']} products per request"}), 400
+        
+        # Verify shop ownership once for the whole batch
+        shop = db.session.get(Shop, shop_id)
+        if shop is None:
+            return jsonify({'error': 'Shop not found'}), 404
+        if shop.owner_id != current_user_id:
+            return jsonify({'error': 'Unauthorized'}), 403
+        
+        results = []
+        valid = []
+        for index, item in enumerate(items):
+            changes, error = validate_product_delta(item)
+            if error:
+                results.append({'index': index, 'status': 'invalid', 'error': error})
+            else:
+                valid.append((index, item, changes))
+                results.append(None)
+        
+        # Resolve ids and SKUs to this shop's products in a few set-based lookups
+        ids = list({item['id'] for _, item, _ in valid if item.get('id') is not None})
+        skus = list({item['sku'] for _, item, _ in valid if item.get('id') is None})
+        by_id = {}
+        by_sku = {}
+        for offset in range(0, max(len(ids), len(skus)), 500):
+            rows = db.session.query(Product.id, Product.sku).filter(
+                Product.shop_id == shop_id,
+                or_(Product.id.in_(ids[offset:offset + 500]), Product.sku.in_(skus[offset:offset + 500]))
+            ).all()
+            for product_id, sku in rows:
+                by_id[product_id] = product_id
+                if sku:
+                    by_sku[sku] = product_id
+        
+        # Later deltas for the same product win, as if applied in order
+        updates = {}
+        for index, item, changes in valid:
+            product_id = by_id.get(item['id']) if item.get('id') is not None else by_sku.get(item['sku'])
+            if product_id is None:
+                results[index] = {'index': index, 'status': 'not_found', 'error': 'Product not found in this shop'}
+                continue
+            updates.setdefault(product_id, {}).update(changes)
+            results[index] = {'index': index, 'id': product_id, 'status': 'updated'}
+        
+        if updates:
+            # One timestamp for the batch so incremental exports and the
+            # similar-products job pick the whole change set up together
+            now = datetime.utcnow()
+            db.session.execute(update(Product), [
+                dict(changes, id=product_id, updated_at=now)
+                for product_id, changes in updates.items()
+            ])
+            db.session.commit()
+        
+        return jsonify({
+            'message': 'Products updated successfully',
+            'updated': len(updates),
+            'failed': sum(1 for result in results if result['status'] != 'updated'),
+            'results': results
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/products/<int:product_id>/similar', methods=['GET'])
+def get_similar_products(product_id):
+    try:
+        if db.session.get(Product, product_id) is None:
+            return jsonify({'error': 'Product not found'}), 404
+        limit = request.args.get('limit', app.config['SIMILAR_PRODUCTS_K'], type=int)
+        if not 1 <= limit <= app.config['SIMILAR_PRODUCTS_K']:
+            return jsonify({'error': f"limit must be between 1 and {app.config['SIMILAR_PRODUCTS_K']}"}), 400
+        
+        rows = db.session.query(Product, ProductSimilarity.score).join(
+            ProductSimilarity, ProductSimilarity.similar_product_id == Product.id
+        ).filter(
+            ProductSimilarity.product_id == product_id,
+            Product.is_available == True
+        ).order_by(ProductSimilarity.rank).limit(limit).all()
+        
+        return jsonify({
+            'products': [dict(product.to_dict(), similarity=score) for product, score in rows]
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # Offer Routes
 @app.route('/api/offers', methods=['GET'])
 def get_offers():
     try:
-        current_date = datetime.utcnow()
-        offers = Offer.query.filter(
-            Offer.is_active == True,
-            Offer.start_date <= current_date,
-            Offer.end_date >= current_date
-        ).all()
+        shop_id = request.args.get('shop_id', type=int)
+        try:
+            valid = parse_flag('valid')
+            in_stock = parse_flag('in_stock')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Live offers unless ?valid=0 asks for scheduled / expired / exhausted ones
+        query = Offer.query.outerjoin(Shop, Shop.id == Offer.shop_id).filter(
+            Offer.is_valid if valid is not False else ~Offer.is_valid
+        )
+        
+        if shop_id:
+            query = query.filter(Offer.shop_id == shop_id)
+        
+        if in_stock is not None:
+            query = query.outerjoin(Product, Product.id == Offer.product_id)
+            if in_stock:
+                # Shop-wide offers always apply; product offers need stock
+                query = query.filter(or_(Offer.product_id.is_(None), Product.is_in_stock))
+            else:
+                query = query.filter(~Product.is_in_stock)
+        
+        offers = query.with_entities(*OFFER_SERIALIZER.columns).all()
         
         return jsonify({
-            'offers': [offer.to_dict() for offer in offers]
+            'offers': OFFER_SERIALIZER.serialize(offers)
         }), 200
         
     except Exception as e:
@@ -414,8 +863,8 @@ def create_offer():
             return jsonify({'error': 'Unauthorized'}), 403
         
         # Parse dates
-        start_date = datetime.fromisoformat(data['start_date'].replace('Z', '+00:00'))
-        end_date = datetime.fromisoformat(data['end_date'].replace('Z', '+00:00'))
+        start_date = parse_datetime(data['start_date'])
+        end_date = parse_datetime(data['end_date'])
         
         # Create new offer
         offer = Offer(
@@ -428,21 +877,117 @@ def create_offer():
             product_id=data.get('product_id'),
             start_date=start_date,
             end_date=end_date,
+            usage_limit=data.get('usage_limit'),
             image_url=data.get('image_url', '')
         )
+        offer.status = offer.compute_status()
         
         db.session.add(offer)
         db.session.commit()
+        offer_scheduler.track(offer)
+        
+        offer_data = offer.to_dict()
+        publish_offer_event('created', offer_data)
         
         return jsonify({
             'message': 'Offer created successfully',
-            'offer': offer.to_dict()
+            'offer': offer_data
         }), 201
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/offers/<int:offer_id>/redeem', methods=['POST'])
+@jwt_required()
+def redeem_offer(offer_id):
+    try:
+        current_user_id = get_jwt_identity()
+        
+        # Count the redemption atomically so concurrent redeems cannot
+        # overshoot the usage limit
+        used = func.coalesce(Offer.used_count, 0)
+        result = db.session.execute(
+            update(Offer)
+            .where(
+                Offer.id == offer_id,
+                Offer.is_valid,
+                or_(Offer.usage_limit.is_(None), used < Offer.usage_limit)
+            )
+            .values(used_count=used + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            db.session.rollback()
+            if db.session.get(Offer, offer_id) is None:
+                return jsonify({'error': 'Offer not found'}), 404
+            return jsonify({'error': 'Offer is not currently redeemable'}), 409
+        
+        # Same transaction as the counter: a repeat redemption rolls the
+        # increment back with it
+        try:
+            db.session.add(OfferRedemption(offer_id=offer_id, user_id=current_user_id))
+            db.session.flush()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({'error': 'You have already redeemed this offer'}), 409
+        
+        shop_id, used_count, usage_limit = db.session.query(
+            Offer.shop_id, Offer.used_count, Offer.usage_limit
+        ).filter(Offer.id == offer_id).one()
+        db.session.commit()
+        
+        redemption = {
+            'offer_id': offer_id,
+            'shop_id': shop_id,
+            'used_count': used_count,
+            'remaining': None if usage_limit is None else max(usage_limit - used_count, 0)
+        }
+        publish_offer_event('redeemed', redemption)
+        if usage_limit is not None and used_count >= usage_limit:
+            # Flips the offer to exhausted and publishes the status change
+            offer_scheduler.refresh(offer_id)
+        
+        return jsonify({
+            'message': 'Offer redeemed successfully',
+            'redemption': redemption
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/offers/stream', methods=['GET'])
+def offers_stream():
+    """Server-Sent Events feed of offer changes, optionally per shop / category"""
+    try:
+        shop_ids = [
+            int(value) for arg in request.args.getlist('shop_id')
+            for value in arg.split(',') if value.strip()
+        ]
+        categories = [
+            value.strip() for arg in request.args.getlist('category')
+            for value in arg.split(',') if value.strip()
+        ]
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        
+        subscription, replay = offer_events.subscribe(shop_ids, categories, last_event_id)
+        response = Response(
+            offer_events.stream(subscription, replay, app.config['OFFER_STREAM_HEARTBEAT_SECONDS']),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+        # Also covers clients that disconnect before the first write
+        response.call_on_close(lambda: offer_events.unsubscribe(subscription))
+        return response
+        
+    except ValueError:
+        return jsonify({'error': 'shop_id must be a list of integers'}), 400
+    except SubscriberLimitReached as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '30'}
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # Review Routes
 @app.route('/api/reviews', methods=['POST'])
 @jwt_required()
@@ -457,6 +1002,24 @@ def create_review():
             if field not in data:
                 return jsonify({'error': f'{field} is required'}), 400
         
+        if app.config['REVIEW_GROUP_COMMIT']:
+            try:
+                review = review_committer.submit({
+                    'rating': data['rating'],
+                    'comment': data.get('comment', ''),
+                    'user_id': current_user_id,
+                    'shop_id': data['shop_id']
+                })
+            except ShopNotFound as e:
+                return jsonify({'error': str(e)}), 404
+            except TimeoutError as e:
+                # Cancelled before it reached the database, safe to retry
+                return jsonify({'error': str(e)}), 503
+            return jsonify({
+                'message': 'Review created successfully',
+                'review': review
+            }), 201
+        
         # Create new review
         review = Review(
             rating=data['rating'],
@@ -493,6 +1056,13 @@ def search():
         query = request.args.get('q', '')
         category = request.args.get('category')
         location = request.args.get('location')
+        try:
+            tags, tag_mode = tag_index.parse_tag_args(request.args)
+            open_slot = opening_hours.requested_slot(
+                request.args.get('open_at'), parse_flag('open_now'), shop_timezone
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Search shops
         shop_query = Shop.query.filter(Shop.is_active == True)
@@ -509,7 +1079,10 @@ def search():
         if location:
             shop_query = shop_query.filter(Shop.location.contains(location))
         
-        shops = shop_query.all()
+        if open_slot is not None:
+            shop_query = opening_hours.filter_open_at(shop_query, Shop, ShopHours, open_slot)
+        
+        shops = shop_query.with_entities(*SHOP_SERIALIZER.columns).all()
         
         # Search products
         product_query = Product.query.filter(Product.is_available == True)
@@ -523,11 +1096,16 @@ def search():
         if category:
             product_query = product_query.filter(Product.category == category)
         
-        products = product_query.all()
+        if tags:
+            product_query = tag_index.filter_by_tags(
+                product_query, db.session, Product, ProductTag, TagCount, tags, tag_mode
+            )
+        
+        products = product_query.with_entities(*PRODUCT_SERIALIZER.columns).all()
         
         result = {
-            'shops': [shop.to_dict() for shop in shops],
-            'products': [product.to_dict() for product in products]
+            'shops': SHOP_SERIALIZER.serialize(shops),
+            'products': PRODUCT_SERIALIZER.serialize(products)
         }
         
         return jsonify(result), 200
@@ -535,6 +1113,97 @@ def search():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Batch Route
+@app.route('/api/batch', methods=['POST'])
+def batch():
+    """Run several GET requests in one round trip"""
+    try:
+        data = request.get_json()
+        sub_requests = data.get('requests') if isinstance(data, dict) else None
+        if not isinstance(sub_requests, list):
+            return jsonify({'error': 'requests is required'}), 400
+        if len(sub_requests) > app.config['BATCH_MAX_REQUESTS']:
+            return jsonify({'error': f"At most {app.config['BATCH_MAX_REQUESTS']} requests per batch"}), 400
+        
+        headers = {}
+        if 'Authorization' in request.headers:
+            headers['Authorization'] = request.headers['Authorization']
+        
+        responses = []
+        for sub_request in sub_requests:
+            if not isinstance(sub_request, dict):
+                sub_request = {}
+            path = sub_request.get('path', '')
+            method = sub_request.get('method', 'GET')
+            
+            if not isinstance(path, str) or not isinstance(method, str):
+                responses.append({'path': path, 'status': 400, 'body': {'error': 'path and method must be strings'}})
+                continue
+            if method.upper() != 'GET':
+                responses.append({'path': path, 'status': 405, 'body': {'error': 'Only GET requests can be batched'}})
+                continue
+            if not path.startswith('/api/') or path.split('?')[0].rstrip('/') == '/api/batch':
+                responses.append({'path': path, 'status': 400, 'body': {'error': 'Invalid path'}})
+                continue
+            
+            with app.test_request_context(
+                path, method='GET', headers=headers,
+                environ_base={'REMOTE_ADDR': request.remote_addr}
+            ):
+                response = app.full_dispatch_request()
+                if response.is_streamed:
+                    response.close()
+                    responses.append({'path': path, 'status': 400, 'body': {'error': 'Streaming endpoints cannot be batched'}})
+                    continue
+                responses.append({
+                    'path': path,
+                    'status': response.status_code,
+                    'body': response.get_json(silent=True)
+                })
+        
+        return jsonify({'responses': responses}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Admin Routes
+EXPORT_TABLES = [User.__table__, Shop.__table__, Product.__table__, Offer.__table__, Review.__table__]
+
+@app.route('/api/admin/export', methods=['GET'])
+@jwt_required()
+def export_snapshot():
+    try:
+        current_user = db.session.get(User, get_jwt_identity())
+        if not current_user or current_user.role != 'admin':
+            return jsonify({'error': 'Unauthorized'}), 403
+        
+        tables = EXPORT_TABLES
+        if request.args.get('tables'):
+            requested = request.args['tables'].split(',')
+            tables = [table for table in EXPORT_TABLES if table.name in requested]
+            if len(tables) != len(set(requested)):
+                return jsonify({'error': 'Unknown table requested'}), 400
+        
+        since = request.args.get('since')
+        if since:
+            since = parse_datetime(since)
+        
+        filename = f"supermall-export-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.ndjson.gz"
+        stream = snapshot_export.stream_ndjson_gzip(
+            db.engine, tables, since, app.config['EXPORT_BATCH_SIZE']
+        )
+        admission_control.detach()
+        return Response(
+            stream_with_context(stream),
+            mimetype='application/gzip',
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # Health check route
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -556,6 +1225,65 @@ def create_tables():
         db.create_all()
         print("Database tables created successfully!")
 
+def create_app():
+    """Return the app with its tables created (used by run.py).
+
+    The configuration class is picked from FLASK_ENV when this module is
+    imported, before any extension reads it.
+    """
+    create_tables()
+    return app
+
+@app.cli.command('upgrade-db')
+def upgrade_db():
+    """Add the tables, columns and indexes an existing database is missing"""
+    with app.app_context():
+        changes = schema_upgrade.upgrade(db.engine, db.metadata)
+    for change in changes:
+        print(change)
+    print(f"Database schema up to date ({len(changes)} changes)")
+
+@app.cli.command('run-offer-scheduler')
+def run_offer_scheduler():
+    """Run the offer lifecycle scheduler in the foreground"""
+    print("Offer scheduler running, press Ctrl+C to stop")
+    offer_scheduler.run_forever()
+
+@app.cli.command('rebuild-tag-index')
+def rebuild_tag_index():
+    """Rebuild the product_tags and tag_counts tables from Product.tags"""
+    tag_index.rebuild(db.session, Product, ProductTag, TagCount)
+    print("Tag index rebuilt successfully!")
+
+@app.cli.command('build-similar-products')
+@click.option('--full', is_flag=True, help='Recompute every product instead of only those changed since the last run')
+def build_similar_products(full):
+    """Precompute top-k similar products"""
+    updated = similar_products.build(
+        db.session, Product, ProductSimilarity, SimilarityRun,
+        k=app.config['SIMILAR_PRODUCTS_K'],
+        block_size=app.config['SIMILAR_PRODUCTS_BLOCK_SIZE'],
+        dims=app.config['SIMILAR_PRODUCTS_DIMS'],
+        full=full
+    )
+    print(f"Similar products updated for {updated} products")
+
+@app.cli.command('export-snapshot')
+@click.argument('out_dir')
+@click.option('--incremental', is_flag=True, help='Only rows updated since the previous export in OUT_DIR')
+@click.option('--format', 'fmt', type=click.Choice(snapshot_export.FORMATS), help='Defaults to parquet when pyarrow is installed')
+def export_snapshot_command(out_dir, incremental, fmt):
+    """Export a consistent catalog snapshot for analytics"""
+    entry = snapshot_export.export_snapshot(
+        db.engine, EXPORT_TABLES, out_dir,
+        incremental=incremental,
+        fmt=fmt,
+        batch_size=app.config['EXPORT_BATCH_SIZE']
+    )
+    for name, table in entry['tables'].items():
+        print(f"{name}: {table['rows']} rows")
+    print(f"Snapshot written to {os.path.join(out_dir, entry['directory'])}")
+
 if __name__ == '__main__':
     create_tables()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,174 @@
+"""
+Negotiated response compression
+
+Compresses JSON and text responses with the best encoding the client
+accepts (brotli and zstd when their packages are installed, gzip always).
+Thresholds and levels can be tuned per endpoint. Compressed bodies of
+cacheable (GET 200) responses are kept in a byte-bounded LRU keyed by a
+digest of the plain body, so each distinct payload is compressed once per
+encoding rather than once per request.
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional
+    zstandard = None
+
+DEFAULT_SETTINGS = {
+    'min_size': 1024,
+    'gzip_level': 6,
+    'brotli_quality': 5,
+    'zstd_level': 3
+}
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/')
+
+
+def available_encodings():
+    """Supported encodings in order of preference"""
+    encodings = []
+    if brotli is not None:
+        encodings.append('br')
+    if zstandard is not None:
+        encodings.append('zstd')
+    encodings.append('gzip')
+    return encodings
+
+
+def parse_accept_encoding(header):
+    """Return ``{encoding: q}`` from an Accept-Encoding header"""
+    accepted = {}
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+    return accepted
+
+
+def negotiate(header, encodings=None):
+    """Pick the preferred encoding the client accepts, or None"""
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get('*', 0.0)
+    for encoding in encodings or available_encodings():
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+def compress_bytes(data, encoding, settings):
+    if encoding == 'br':
+        return brotli.compress(data, quality=settings['brotli_quality'])
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=settings['zstd_level']).compress(data)
+    return gzip.compress(data, compresslevel=settings['gzip_level'], mtime=0)
+
+
+class CompressedCache:
+    """Byte-bounded LRU of compressed bodies"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = value
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+class ResponseCompressor:
+    """after_request hook that negotiates and applies Content-Encoding"""
+
+    def __init__(self, app=None):
+        self.cache = None
+        self.defaults = dict(DEFAULT_SETTINGS)
+        self.route_settings = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.defaults = dict(
+            DEFAULT_SETTINGS,
+            min_size=app.config.get('COMPRESSION_MIN_SIZE', DEFAULT_SETTINGS['min_size'])
+        )
+        self.route_settings = {
+            endpoint: dict(self.defaults, **overrides)
+            for endpoint, overrides in app.config.get('COMPRESSION_ROUTES', {}).items()
+        }
+        self.cache = CompressedCache(app.config.get('COMPRESSION_CACHE_BYTES', 32 * 1024 * 1024))
+        app.after_request(self.compress_response)
+
+    def compress_response(self, response):
+        if (
+            response.direct_passthrough
+            or response.is_streamed
+            or response.status_code < 200
+            or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers
+            or not (response.mimetype or '').startswith(COMPRESSIBLE_MIMETYPES)
+        ):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        settings = self.route_settings.get(request.endpoint, self.defaults)
+        data = response.get_data()
+        if len(data) < settings['min_size']:
+            return response
+
+        encoding = negotiate(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+
+        if request.method == 'GET' and response.status_code == 200:
+            level = settings['brotli_quality'] if encoding == 'br' else settings[f'{encoding}_level']
+            key = (encoding, level, hashlib.blake2b(data, digest_size=16).digest())
+            compressed = self.cache.get(key)
+            if compressed is None:
+                compressed = compress_bytes(data, encoding, settings)
+                self.cache.put(key, compressed)
+        else:
+            compressed = compress_bytes(data, encoding, settings)
+
+        if len(compressed) >= len(data):
+            return response
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        return response
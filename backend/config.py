@@ -9,6 +9,69 @@ class Config:
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
 
+    # Offer lifecycle scheduler; with it disabled in web workers, run
+    # `flask run-offer-scheduler` as its own process
+    OFFER_SCHEDULER_ENABLED = os.environ.get('OFFER_SCHEDULER_ENABLED', '1') == '1'
+    OFFER_SCHEDULER_TICK_SECONDS = float(os.environ.get('OFFER_SCHEDULER_TICK_SECONDS', '1'))
+
+    # Server-Sent Events feed of offer changes. Each open stream holds one
+    # server thread, so keep the cap within the server's thread budget
+    OFFER_STREAM_BUFFER_SIZE = int(os.environ.get('OFFER_STREAM_BUFFER_SIZE', '1000'))
+    OFFER_STREAM_MAX_SUBSCRIBERS = int(os.environ.get('OFFER_STREAM_MAX_SUBSCRIBERS', '200'))
+    OFFER_STREAM_HEARTBEAT_SECONDS = float(os.environ.get('OFFER_STREAM_HEARTBEAT_SECONDS', '15'))
+
+    # Group commit for review writes (opt-in)
+    REVIEW_GROUP_COMMIT = os.environ.get('REVIEW_GROUP_COMMIT', '0') == '1'
+    REVIEW_GROUP_COMMIT_WINDOW_MS = float(os.environ.get('REVIEW_GROUP_COMMIT_WINDOW_MS', '5'))
+    REVIEW_GROUP_COMMIT_MAX_BATCH = int(os.environ.get('REVIEW_GROUP_COMMIT_MAX_BATCH', '200'))
+
+    # Timezone used to interpret shop opening hours for open_now / open_at
+    SHOP_TIMEZONE = os.environ.get('SHOP_TIMEZONE', 'UTC')
+
+    # Offline similar-products job
+    SIMILAR_PRODUCTS_K = int(os.environ.get('SIMILAR_PRODUCTS_K', '10'))
+    SIMILAR_PRODUCTS_BLOCK_SIZE = int(os.environ.get('SIMILAR_PRODUCTS_BLOCK_SIZE', '512'))
+    SIMILAR_PRODUCTS_DIMS = int(os.environ.get('SIMILAR_PRODUCTS_DIMS', '1024'))
+
+    # Analytics snapshot export
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '1000'))
+
+    # Maximum sub-requests accepted by POST /api/batch
+    BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', '20'))
+
+    # Maximum deltas accepted by PATCH /api/shops/<id>/products
+    BULK_UPDATE_MAX_ITEMS = int(os.environ.get('BULK_UPDATE_MAX_ITEMS', '5000'))
+
+    # Response compression (br / zstd when installed, gzip always)
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+    COMPRESSION_CACHE_BYTES = int(os.environ.get('COMPRESSION_CACHE_BYTES', str(32 * 1024 * 1024)))
+    COMPRESSION_ROUTES = {
+        'get_products': {'min_size': 512, 'brotli_quality': 7, 'gzip_level': 7, 'zstd_level': 6},
+        'search': {'min_size': 512, 'brotli_quality': 7, 'gzip_level': 7, 'zstd_level': 6},
+        'get_shop_page': {'min_size': 512},
+        'batch': {'min_size': 512}
+    }
+
+    # Adaptive admission control: shared AIMD concurrency limit, per-class
+    # overrides go in ADMISSION_CLASSES (share, target_latency, deadline)
+    ADMISSION_CONTROL_ENABLED = os.environ.get('ADMISSION_CONTROL_ENABLED', '1') == '1'
+    ADMISSION_INITIAL_LIMIT = int(os.environ.get('ADMISSION_INITIAL_LIMIT', '32'))
+    ADMISSION_MIN_LIMIT = int(os.environ.get('ADMISSION_MIN_LIMIT', '4'))
+    ADMISSION_MAX_LIMIT = int(os.environ.get('ADMISSION_MAX_LIMIT', '256'))
+    ADMISSION_CLASSES = {}
+
+    # Per-endpoint rate limits keyed by client IP and/or JWT identity
+    # ("<count>/<second|minute|hour|day>[;burst=<n>]")
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+    RATE_LIMIT_STORAGE_URL = os.environ.get('RATE_LIMIT_STORAGE_URL', 'memory://')
+    RATE_LIMIT_MAX_KEYS = 100000
+    RATE_LIMITS = {
+        'login': {'ip': '10/minute'},
+        'register': {'ip': '5/minute'},
+        'search': {'ip': '60/minute;burst=30', 'identity': '120/minute;burst=60'},
+        'redeem_offer': {'ip': '30/minute', 'identity': '10/minute'}
+    }
+
 class DevelopmentConfig(Config):
     DEBUG = True
 
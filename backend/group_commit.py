@@ -0,0 +1,161 @@
+"""
+Group commit for review writes
+
+Concurrent ``create_review`` calls that arrive within a short window are
+coalesced into a single transaction by one writer thread. Shop rating
+aggregates are recomputed once per affected shop per batch, and every caller
+still receives its own committed review (with its id) or its own error.
+
+A caller that times out cancels its review if the writer has not picked it
+up yet, so a ``TimeoutError`` always means nothing was written and the
+client can safely retry. Once the writer has claimed a review the caller
+waits for the outcome instead.
+"""
+import queue
+import threading
+import time
+
+from sqlalchemy import func
+
+
+class ShopNotFound(Exception):
+    """Raised for a review whose shop does not exist"""
+
+
+class _PendingReview:
+    __slots__ = ('fields', 'done', 'result', 'error', 'claimed', 'cancelled')
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.done = threading.Event()
+        self.claimed = False
+        self.cancelled = False
+        self.result = None
+        self.error = None
+
+
+class ReviewGroupCommitter:
+    """Batches review inserts into shared transactions"""
+
+    def __init__(self, app, db, review_model, shop_model, window=0.005, max_batch=200):
+        self.app = app
+        self.db = db
+        self.review_model = review_model
+        self.shop_model = shop_model
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._claim_lock = threading.Lock()
+
+    def submit(self, fields, timeout=30):
+        """Queue a review for the next batch and wait until it is committed.
+
+        Returns the committed review as a dict; re-raises the error that made
+        this particular review fail. Raises TimeoutError, with the review
+        cancelled, if the writer has not picked it up within ``timeout``.
+        """
+        self._ensure_started()
+        pending = _PendingReview(fields)
+        self._queue.put(pending)
+        if not pending.done.wait(timeout):
+            with self._claim_lock:
+                pending.cancelled = not pending.claimed
+            if pending.cancelled:
+                raise TimeoutError('Timed out waiting for review to be committed; it was not saved')
+            # Already in a transaction: its outcome is moments away
+            pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                thread = threading.Thread(
+                    target=self._run, name='review-group-commit', daemon=True
+                )
+                thread.start()
+                self._thread = thread
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            with self._claim_lock:
+                batch = [pending for pending in batch if not pending.cancelled]
+                for pending in batch:
+                    pending.claimed = True
+            if not batch:
+                continue
+
+            with self.app.app_context():
+                self._commit(batch)
+
+    def _commit(self, batch):
+        try:
+            results = self._write(batch)
+        except Exception:
+            self.db.session.rollback()
+            # Isolate the offending review(s): retry each in its own transaction
+            for pending in batch:
+                try:
+                    pending.result = self._write([pending])[0]
+                except Exception as e:
+                    self.db.session.rollback()
+                    pending.error = e
+                pending.done.set()
+            return
+
+        for pending, result in zip(batch, results):
+            if pending.error is None:
+                pending.result = result
+            pending.done.set()
+
+    def _write(self, batch):
+        Review = self.review_model
+        Shop = self.shop_model
+
+        # The foreign key is not enforced everywhere (SQLite), so reviews for
+        # unknown shops are failed here rather than committed as orphans
+        shops = {
+            shop.id: shop
+            for shop in Shop.query.filter(
+                Shop.id.in_({pending.fields['shop_id'] for pending in batch})
+            ).all()
+        }
+        reviews = {}
+        for pending in batch:
+            if pending.fields['shop_id'] in shops:
+                reviews[pending] = Review(**pending.fields)
+            else:
+                pending.error = ShopNotFound('Shop not found')
+        self.db.session.add_all(reviews.values())
+        self.db.session.flush()
+
+        # One aggregate query and one update per shop touched by the batch
+        shop_ids = {review.shop_id for review in reviews.values()}
+        aggregates = self.db.session.query(
+            Review.shop_id, func.count(Review.id), func.avg(Review.rating)
+        ).filter(Review.shop_id.in_(shop_ids)).group_by(Review.shop_id).all()
+        for shop_id, total_reviews, average in aggregates:
+            shop = shops[shop_id]
+            shop.rating = float(average)
+            shop.total_reviews = total_reviews
+
+        # Serialize before commit expires the instances; None for rejected reviews
+        results = [reviews[pending].to_dict() if pending in reviews else None for pending in batch]
+        self.db.session.commit()
+        return results
@@ -1,7 +1,7 @@
 from .user import User
-from .shop import Shop
-from .product import Product
-from .offer import Offer
+from .shop import Shop, ShopHours
+from .product import Product, ProductTag, TagCount, ProductSimilarity, SimilarityRun
+from .offer import Offer, OfferRedemption
 from .review import Review
 
-__all__ = ['User', 'Shop', 'Product', 'Offer', 'Review']
\ No newline at end of file
+__all__ = ['User', 'Shop', 'ShopHours', 'Product', 'ProductTag', 'TagCount', 'ProductSimilarity', 'SimilarityRun', 'Offer', 'OfferRedemption', 'Review']
\ No newline at end of file
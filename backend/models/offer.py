@@ -1,5 +1,7 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import and_
+from sqlalchemy.ext.hybrid import hybrid_property
 
 db = SQLAlchemy()
 
@@ -31,6 +33,9 @@ class Offer(db.Model):
     
     # Status
     is_active = db.Column(db.Boolean, default=True)
+    # Materialized lifecycle state: inactive, scheduled, live, exhausted, expired.
+    # Kept current by the offer scheduler so listings filter on one indexed column.
+    status = db.Column(db.String(20), default='scheduled', index=True)
     
     # Images
     image_url = db.Column(db.String(500))
@@ -40,15 +45,31 @@ class Offer(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    @property
+    def compute_status(self, now=None):
+        """Derive the lifecycle status from the flags, dates and usage counters"""
+        now = now or datetime.utcnow()
+        if self.is_active is False:  # None until the column default is applied
+            return 'inactive'
+        if now < self.start_date:
+            return 'scheduled'
+        if now > self.end_date:
+            return 'expired'
+        if self.usage_limit is not None and (self.used_count or 0) >= self.usage_limit:
+            return 'exhausted'
+        return 'live'
+    
+    @hybrid_property
     def is_valid(self):
         """Check if offer is currently valid"""
-        now = datetime.utcnow()
-        return (
-            self.is_active and 
-            self.start_date <= now <= self.end_date and
-            (self.usage_limit is None or self.used_count < self.usage_limit)
-        )
+        if self.status is None:
+            return self.compute_status() == 'live'
+        return self.status == 'live' and self.end_date >= datetime.utcnow()
+    
+    @is_valid.expression
+    def is_valid(cls):
+        # The scheduler keeps status current; the end_date guard keeps
+        # expired offers out of listings while no scheduler is running
+        return and_(cls.status == 'live', cls.end_date >= datetime.utcnow())
     
     @property
     def days_remaining(self):
@@ -56,12 +77,8 @@ class Offer(db.Model):
         if not self.is_valid:
             return 0
         
-        now = datetime.utcnow()
-        if now > self.end_date:
-            return 0
-        
-        delta = self.end_date - now
-        return delta.days
+        delta = self.end_date - datetime.utcnow()
+        return max(delta.days, 0)
     
     def calculate_discount(self, order_value):
         """Calculate discount amount based on order value"""
@@ -101,6 +118,7 @@ class Offer(db.Model):
             'start_date': self.start_date.isoformat() if self.start_date else None,
             'end_date': self.end_date.isoformat() if self.end_date else None,
             'is_active': self.is_active,
+            'status': self.status,
             'is_valid': self.is_valid,
             'days_remaining': self.days_remaining,
             'image_url': self.image_url,
@@ -118,4 +136,26 @@ class Offer(db.Model):
         return data
     
     def __repr__(self):
-        return f'<Offer {self.title}>'
\ No newline at end of file
+        return f'<Offer {self.title}>'
+
+
+class OfferRedemption(db.Model):
+    """One user's redemption of an offer; at most one per user and offer"""
+    __tablename__ = 'offer_redemptions'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    offer_id = db.Column(db.Integer, db.ForeignKey('offers.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    redeemed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('offer_id', 'user_id', name='uq_offer_redemptions_offer_user'),)
+    
+    def __repr__(self):
+        return f'<OfferRedemption {self.offer_id} by {self.user_id}>'
+
+
+# Live offers per shop, in expiry order (shop pages, ?shop_id= listings)
+db.Index(
+    'ix_offers_live', Offer.shop_id, Offer.end_date,
+    postgresql_where=Offer.status == 'live', sqlite_where=Offer.status == 'live'
+)
@@ -1,5 +1,6 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.ext.hybrid import hybrid_property
 
 db = SQLAlchemy()
 
@@ -17,7 +18,7 @@ class Product(db.Model):
     # Product details
     sku = db.Column(db.String(50), unique=True)
     brand = db.Column(db.String(50))
-    tags = db.Column(db.JSON)  # Store as JSON array
+    tags = db.Column(db.JSON)  # Store as JSON array, indexed in product_tags
     
     # Images
     image_url = db.Column(db.String(500))
@@ -41,12 +42,14 @@ class Product(db.Model):
     # Relationships
     offers = db.relationship('Offer', backref='product', lazy=True, cascade='all, delete-orphan')
     
-    @property
+    # Hybrids: the same comparison runs on instances and renders as SQL,
+    # so Product.query.filter(Product.is_in_stock) is evaluated by the database
+    @hybrid_property
     def is_low_stock(self):
         """Check if product is low in stock"""
         return self.stock_quantity <= self.low_stock_threshold
     
-    @property
+    @hybrid_property
     def is_in_stock(self):
         """Check if product is in stock"""
         return self.stock_quantity > 0
@@ -83,4 +86,78 @@ class Product(db.Model):
         return data
     
     def __repr__(self):
-        return f'<Product {self.name}>'
\ No newline at end of file
+        return f'<Product {self.name}>'
+
+
+# Partial indexes whose predicates are the hybrid expressions, so in-stock
+# listings and low-stock reports only touch the rows they return
+_available_in_stock = db.and_(Product.is_available == True, Product.is_in_stock)  # noqa: E712
+db.Index(
+    'ix_products_in_stock', Product.category, Product.shop_id,
+    postgresql_where=_available_in_stock, sqlite_where=_available_in_stock
+)
+db.Index(
+    'ix_products_low_stock', Product.shop_id,
+    postgresql_where=Product.is_low_stock, sqlite_where=Product.is_low_stock
+)
+
+
+class ProductTag(db.Model):
+    """Posting list entry of the inverted tag index (tag -> product id)"""
+    __tablename__ = 'product_tags'
+    
+    tag = db.Column(db.String(50), primary_key=True)
+    product_id = db.Column(
+        db.Integer,
+        db.ForeignKey('products.id', ondelete='CASCADE'),
+        primary_key=True,
+        index=True
+    )
+    
+    def __repr__(self):
+        return f'<ProductTag {self.tag} -> {self.product_id}>'
+
+
+class TagCount(db.Model):
+    """Length of one tag's posting list, for ordering tag intersections"""
+    __tablename__ = 'tag_counts'
+    
+    tag = db.Column(db.String(50), primary_key=True)
+    product_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<TagCount {self.tag}: {self.product_count}>'
+
+
+class ProductSimilarity(db.Model):
+    """Precomputed neighbour of a product, written by the similar-products job"""
+    __tablename__ = 'product_similarities'
+    
+    product_id = db.Column(
+        db.Integer,
+        db.ForeignKey('products.id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    rank = db.Column(db.Integer, primary_key=True)  # 1 = most similar
+    similar_product_id = db.Column(
+        db.Integer,
+        db.ForeignKey('products.id', ondelete='CASCADE'),
+        nullable=False
+    )
+    score = db.Column(db.Float, nullable=False)  # Cosine similarity
+    
+    def __repr__(self):
+        return f'<ProductSimilarity {self.product_id} #{self.rank} -> {self.similar_product_id}>'
+
+
+class SimilarityRun(db.Model):
+    """Bookkeeping for incremental similar-products refreshes"""
+    __tablename__ = 'similarity_runs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, nullable=False, index=True)
+    finished_at = db.Column(db.DateTime)
+    products_updated = db.Column(db.Integer, default=0)
+    
+    def __repr__(self):
+        return f'<SimilarityRun {self.started_at}>'
\ No newline at end of file
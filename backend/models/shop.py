@@ -23,7 +23,7 @@ class Shop(db.Model):
     longitude = db.Column(db.Float)
     
     # Business details
-    opening_hours = db.Column(db.JSON)  # Store as JSON
+    opening_hours = db.Column(db.JSON)  # Store as JSON, compiled into shop_hours on write
     owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     
     # Ratings and status
@@ -82,4 +82,24 @@ class Shop(db.Model):
             self.total_reviews = 0
     
     def __repr__(self):
-        return f'<Shop {self.name}>'
\ No newline at end of file
+        return f'<Shop {self.name}>'
+
+
+class ShopHours(db.Model):
+    """Compiled opening interval over the 672 fifteen-minute slots of a week"""
+    __tablename__ = 'shop_hours'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    shop_id = db.Column(
+        db.Integer,
+        db.ForeignKey('shops.id', ondelete='CASCADE'),
+        nullable=False,
+        index=True
+    )
+    start_slot = db.Column(db.Integer, nullable=False)  # Monday 00:00 = 0
+    end_slot = db.Column(db.Integer, nullable=False)  # Exclusive
+    
+    __table_args__ = (db.Index('ix_shop_hours_slots', 'start_slot', 'end_slot'),)
+    
+    def __repr__(self):
+        return f'<ShopHours {self.shop_id} {self.start_slot}-{self.end_slot}>'
\ No newline at end of file
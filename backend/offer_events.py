@@ -0,0 +1,190 @@
+"""
+Live offer events over Server-Sent Events
+
+``OfferEventBroker`` is an in-process pub/sub for offer changes (new offers,
+lifecycle status changes from the scheduler, redemptions). Each event is
+encoded into an SSE frame once and appended to a bounded ring buffer, so a
+client reconnecting with ``Last-Event-ID`` is replayed exactly what it
+missed while the gap is still buffered, and told to ``reset`` (refetch
+``/api/offers``) when it is not.
+
+Subscriptions are indexed by shop and category, so publishing only touches
+the connections that asked for the event; idle connections sleep on their
+own wakeup event until something arrives or a heartbeat is due. Each open
+stream still occupies one server thread for as long as it is connected, so
+``max_subscribers`` must stay within the server's thread budget.
+
+Events are only seen by the process that published them; with several
+workers, put a sticky load balancer or a shared broker in front.
+"""
+import json
+import threading
+import time
+from collections import deque
+
+
+class SubscriberLimitReached(Exception):
+    """Raised when the broker already serves its maximum number of streams"""
+
+
+def encode_frame(event_id, event_type, data):
+    """Encode one SSE frame"""
+    payload = json.dumps(data, separators=(',', ':'), sort_keys=True)
+    return f'id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n'.encode('utf-8')
+
+
+class Subscription:
+    """One open stream: its filters and the frames waiting to be sent"""
+
+    def __init__(self, shop_ids, categories, max_pending):
+        self.shop_ids = frozenset(shop_ids or ())
+        self.categories = frozenset(categories or ())
+        self.max_pending = max_pending
+        self.overflowed = False
+        self.closed = False
+        self._pending = deque()
+        self._wakeup = threading.Event()
+
+    @property
+    def wants_everything(self):
+        return not self.shop_ids and not self.categories
+
+    def push(self, frame):
+        if len(self._pending) >= self.max_pending:
+            # A client this far behind reconnects and catches up from the
+            # ring buffer instead of growing an unbounded queue here
+            self.overflowed = True
+        else:
+            self._pending.append(frame)
+        self._wakeup.set()
+
+    def wait(self, timeout):
+        """Block until frames arrive or ``timeout`` passes; returns the frames"""
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
+        frames = []
+        while self._pending:
+            frames.append(self._pending.popleft())
+        return frames
+
+
+class OfferEventBroker:
+    """Fans offer events out to SSE subscribers"""
+
+    def __init__(self, buffer_size=1000, max_subscribers=200, max_pending=256):
+        # Event ids are "<stream>-<sequence>"; the stream part changes on
+        # every restart so ids from a previous process are never misread
+        self.stream_id = format(time.time_ns(), 'x')
+        self.max_subscribers = max_subscribers
+        self.max_pending = max_pending
+        self._sequence = 0
+        self._buffer = deque(maxlen=buffer_size)
+        self._everyone = set()
+        self._by_shop = {}
+        self._by_category = {}
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def event_id(self, sequence):
+        return f'{self.stream_id}-{sequence}'
+
+    def publish(self, event_type, data, shop_id=None, category=None):
+        """Buffer an event and deliver it to every matching subscription"""
+        with self._lock:
+            self._sequence += 1
+            event_id = self.event_id(self._sequence)
+            frame = encode_frame(event_id, event_type, data)
+            self._buffer.append((self._sequence, shop_id, category, frame))
+
+            targets = set(self._everyone)
+            targets.update(self._by_shop.get(shop_id, ()))
+            targets.update(self._by_category.get(category, ()))
+            for subscription in targets:
+                subscription.push(frame)
+        return event_id
+
+    def subscribe(self, shop_ids=None, categories=None, last_event_id=None):
+        """Open a subscription; returns it with the frames to replay first.
+
+        A subscription with both shop and category filters receives events
+        matching either of them.
+        """
+        subscription = Subscription(shop_ids, categories, self.max_pending)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                raise SubscriberLimitReached('Too many open offer streams')
+            self._count += 1
+            if subscription.wants_everything:
+                self._everyone.add(subscription)
+            for shop_id in subscription.shop_ids:
+                self._by_shop.setdefault(shop_id, set()).add(subscription)
+            for category in subscription.categories:
+                self._by_category.setdefault(category, set()).add(subscription)
+
+            # Registering and reading the backlog under one lock means the
+            # replay and the live feed neither overlap nor leave a gap
+            replay = [] if last_event_id is None else self._replay(subscription, last_event_id)
+        return subscription, replay
+
+    def _replay(self, subscription, last_event_id):
+        stream_id, _, sequence = last_event_id.rpartition('-')
+        oldest = self._buffer[0][0] if self._buffer else self._sequence + 1
+        try:
+            sequence = int(sequence)
+        except ValueError:
+            sequence = None
+
+        if stream_id != self.stream_id or sequence is None or sequence < oldest - 1:
+            return [encode_frame(self.event_id(self._sequence), 'reset', {
+                'reason': 'Missed events are no longer available, refetch offers'
+            })]
+        return [
+            frame for buffered, shop_id, category, frame in self._buffer
+            if buffered > sequence and (
+                subscription.wants_everything
+                or shop_id in subscription.shop_ids
+                or category in subscription.categories
+            )
+        ]
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription.closed:
+                return
+            subscription.closed = True
+            self._everyone.discard(subscription)
+            for shop_id in subscription.shop_ids:
+                self._discard(self._by_shop, shop_id, subscription)
+            for category in subscription.categories:
+                self._discard(self._by_category, category, subscription)
+            self._count -= 1
+
+    @staticmethod
+    def _discard(index, key, subscription):
+        subscribers = index.get(key)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del index[key]
+
+    def stream(self, subscription, replay=(), heartbeat=15.0, retry_ms=3000):
+        """Yield the SSE body for one subscription until the client leaves"""
+        try:
+            yield f'retry: {retry_ms}\n\n'.encode('utf-8')
+            if replay:
+                yield b''.join(replay)
+            while True:
+                frames = subscription.wait(heartbeat)
+                if frames:
+                    yield b''.join(frames)
+                elif not subscription.overflowed:
+                    # Comment line: keeps proxies from timing the stream out
+                    # and surfaces closed connections on the next write
+                    yield b': keepalive\n\n'
+                if subscription.overflowed:
+                    return
+        finally:
+            self.unsubscribe(subscription)
+
+    def __len__(self):
+        return self._count
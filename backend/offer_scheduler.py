@@ -0,0 +1,237 @@
+"""
+Offer lifecycle scheduler
+
+Keeps the materialized ``Offer.status`` column in step with each offer's
+validity window so listings can filter on a single indexed column instead of
+re-evaluating dates and usage counters row by row. Every pending boundary
+(``start_date`` for scheduled offers, ``end_date`` for live ones) sits in a
+hashed timing wheel; a background thread advances the wheel once per tick and
+re-evaluates only the offers whose boundary has been reached.
+
+Deployments that keep the scheduler out of their web workers run it as a
+process of its own (``flask run-offer-scheduler``). Offers written by other
+processes never reach that process's wheel, so it polls for offers whose
+boundary has already passed instead.
+"""
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+EPOCH = datetime(1970, 1, 1)
+
+# Statuses that still have a boundary ahead of them
+PENDING_STATUSES = ('scheduled', 'live', 'exhausted')
+
+
+def to_timestamp(value):
+    """Convert a naive UTC datetime to a POSIX timestamp"""
+    return (value - EPOCH).total_seconds()
+
+
+class TimingWheel:
+    """Hashed timing wheel keyed by an arbitrary hashable id.
+
+    Each key has at most one pending deadline; scheduling it again replaces
+    the previous one. Deadlines further away than one rotation simply stay in
+    their slot until the wheel comes round to the matching tick.
+    """
+
+    def __init__(self, slots=3600, resolution=1.0, now=None):
+        self.resolution = resolution
+        self._slots = [dict() for _ in range(slots)]
+        self._keys = {}
+        self._lock = threading.Lock()
+        self._current = self._tick(time.time() if now is None else now)
+
+    def _tick(self, timestamp):
+        return int(timestamp // self.resolution)
+
+    def schedule(self, key, timestamp):
+        """Schedule ``key`` to fire once ``timestamp`` has passed"""
+        with self._lock:
+            self._discard(key)
+            due = max(self._tick(timestamp) + 1, self._current + 1)
+            index = due % len(self._slots)
+            self._slots[index][key] = due
+            self._keys[key] = index
+
+    def cancel(self, key):
+        """Drop any pending deadline for ``key``"""
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key):
+        index = self._keys.pop(key, None)
+        if index is not None:
+            self._slots[index].pop(key, None)
+
+    def advance(self, timestamp):
+        """Move the wheel forward and return the keys that are now due"""
+        fired = []
+        with self._lock:
+            target = self._tick(timestamp)
+            if target <= self._current:
+                return fired
+
+            # After a long stall one full rotation is enough to see every slot
+            span = min(target - self._current, len(self._slots))
+            for tick in range(target - span + 1, target + 1):
+                slot = self._slots[tick % len(self._slots)]
+                due = [key for key, deadline in slot.items() if deadline <= target]
+                for key in due:
+                    del slot[key]
+                    del self._keys[key]
+                fired.extend(due)
+
+            self._current = target
+        return fired
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class OfferScheduler:
+    """Flips offers between lifecycle states exactly at their boundaries.
+
+    Listeners registered with :meth:`subscribe` receive one event dict per
+    status change, after the change has been committed.
+    """
+
+    def __init__(self, app, db, model, tick_seconds=1.0, wheel_slots=3600):
+        self.app = app
+        self.db = db
+        self.model = model
+        self.tick_seconds = tick_seconds
+        self.wheel = TimingWheel(slots=wheel_slots, resolution=tick_seconds)
+        self._listeners = []
+        self._started = False
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, callback):
+        """Register a callback for status change events"""
+        self._listeners.append(callback)
+        return callback
+
+    def start(self):
+        """Sweep stale statuses and start the background ticker (idempotent)"""
+        if self._started:
+            return
+        with self._start_lock:
+            if self._started:
+                return
+            self.sweep()
+            self._thread = threading.Thread(
+                target=self._run, name='offer-scheduler', daemon=True
+            )
+            self._thread.start()
+            self._started = True
+
+    def sweep(self):
+        """Re-evaluate every offer that may have crossed a boundary"""
+        with self.app.app_context():
+            offers = self.model.query.filter(
+                self.model.status.is_(None) | self.model.status.in_(PENDING_STATUSES)
+            ).all()
+            self._apply(offers)
+
+    def sweep_due(self):
+        """Re-evaluate only the offers whose next boundary has already passed"""
+        now = datetime.utcnow()
+        model = self.model
+        with self.app.app_context():
+            offers = model.query.filter(or_(
+                model.status.is_(None),
+                and_(model.status == 'scheduled', model.start_date <= now),
+                and_(model.status.in_(('live', 'exhausted')), model.end_date < now)
+            )).all()
+            self._apply(offers)
+        return len(offers)
+
+    def run_forever(self):
+        """Poll for due offers in the foreground, for a dedicated process"""
+        while True:
+            try:
+                self.sweep_due()
+            except Exception as e:
+                self.app.logger.exception('Offer scheduler poll failed: %s', e)
+            time.sleep(self.tick_seconds)
+
+    def track(self, offer):
+        """Schedule the next boundary of a freshly written offer"""
+        self._schedule(offer.id, self.next_boundary(offer))
+
+    def _schedule(self, offer_id, boundary):
+        if boundary is None:
+            self.wheel.cancel(offer_id)
+        else:
+            self.wheel.schedule(offer_id, to_timestamp(boundary))
+
+    def refresh(self, offer_id):
+        """Re-evaluate one offer now, e.g. after its usage counter changed"""
+        with self.app.app_context():
+            offer = self.db.session.get(self.model, offer_id)
+            if offer is not None:
+                self._apply([offer])
+
+    @staticmethod
+    def next_boundary(offer):
+        """Return the datetime at which ``offer`` next changes status"""
+        if offer.status == 'scheduled':
+            return offer.start_date
+        if offer.status in ('live', 'exhausted'):
+            return offer.end_date
+        return None
+
+    def _run(self):
+        while True:
+            time.sleep(self.tick_seconds)
+            due = self.wheel.advance(time.time())
+            if not due:
+                continue
+            try:
+                with self.app.app_context():
+                    offers = self.model.query.filter(self.model.id.in_(due)).all()
+                    self._apply(offers)
+            except Exception as e:
+                self.app.logger.exception('Offer scheduler tick failed: %s', e)
+                # Retry on the next tick rather than losing the boundaries
+                retry_at = time.time()
+                for offer_id in due:
+                    self.wheel.schedule(offer_id, retry_at)
+
+    def _apply(self, offers):
+        now = datetime.utcnow()
+        events = []
+        for offer in offers:
+            status = offer.compute_status(now)
+            if status != offer.status:
+                events.append({
+                    'offer_id': offer.id,
+                    'shop_id': offer.shop_id,
+                    'previous_status': offer.status,
+                    'status': status,
+                    'changed_at': now.isoformat()
+                })
+                offer.status = status
+
+        # Read boundaries before committing expires the loaded attributes
+        boundaries = [(offer.id, self.next_boundary(offer)) for offer in offers]
+
+        if events:
+            self.db.session.commit()
+
+        for offer_id, boundary in boundaries:
+            self._schedule(offer_id, boundary)
+
+        for event in events:
+            self._publish(event)
+
+    def _publish(self, event):
+        for callback in list(self._listeners):
+            try:
+                callback(event)
+            except Exception as e:
+                self.app.logger.exception('Offer status listener failed: %s', e)
@@ -0,0 +1,170 @@
+"""
+Compiled shop opening hours
+
+``Shop.opening_hours`` is free-form JSON keyed by weekday. On every write it
+is compiled into a list of half-open intervals over the 672 fifteen-minute
+slots of a week (Monday 00:00 is slot 0) and stored in ``shop_hours``, so
+"open at" filters become one indexed range lookup per query.
+
+Accepted day values::
+
+    "09:00-18:00"                         single range
+    ["09:00-12:00", "13:00-18:00"]        several ranges
+    {"open": "09:00", "close": "18:00"}   object form (or a list of them)
+    "closed" / null                       closed all day
+    "24h"                                 open all day
+
+A range that closes at or before it opens (``"22:00-02:00"``) runs past
+midnight into the next day; Sunday wraps around to Monday. Opening times are
+rounded up and closing times down to the slot, so a shop is never reported
+open outside its hours: "09:10-17:50" counts as open from 09:15 to 17:45.
+"""
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import event, inspect, select
+
+SLOT_MINUTES = 15
+MINUTES_PER_DAY = 24 * 60
+SLOTS_PER_DAY = MINUTES_PER_DAY // SLOT_MINUTES
+WEEK_SLOTS = 7 * SLOTS_PER_DAY
+
+DAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+DAY_ALIASES = {day[:3]: day for day in DAYS}
+
+
+def _parse_time(value):
+    hours, _, minutes = str(value).strip().partition(':')
+    hours, minutes = int(hours), int(minutes or 0)
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or (hours == 24 and minutes):
+        raise ValueError(f'Invalid time: {value}')
+    return hours * 60 + minutes
+
+
+def _day_ranges(value):
+    if value is None:
+        return []
+    if isinstance(value, dict):
+        if 'open' not in value or 'close' not in value:
+            raise ValueError(f'Opening hours need both open and close: {value!r}')
+        return [(_parse_time(value['open']), _parse_time(value['close']))]
+    if isinstance(value, list):
+        return [r for item in value for r in _day_ranges(item)]
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in ('', 'closed'):
+            return []
+        if text in ('24h', '24/7', 'open 24 hours'):
+            return [(0, MINUTES_PER_DAY)]
+        opens, sep, closes = text.partition('-')
+        if not sep:
+            raise ValueError(f'Invalid opening hours range: {value}')
+        return [(_parse_time(opens), _parse_time(closes))]
+    raise ValueError(f'Invalid opening hours value: {value!r}')
+
+
+def compile_hours(opening_hours):
+    """Compile opening hours JSON into sorted, merged week-slot intervals.
+
+    Raises ValueError if the JSON cannot be understood.
+    """
+    if not opening_hours:
+        return []
+    if not isinstance(opening_hours, dict):
+        raise ValueError('opening_hours must be an object keyed by weekday')
+
+    intervals = []
+    for key, value in opening_hours.items():
+        day = DAY_ALIASES.get(str(key).strip().lower()[:3])
+        if day is None:
+            raise ValueError(f'Unknown weekday: {key}')
+        base = DAYS.index(day) * SLOTS_PER_DAY
+        for opens, closes in _day_ranges(value):
+            if closes <= opens:
+                closes += MINUTES_PER_DAY
+            start = base + -(-opens // SLOT_MINUTES)
+            end = base + closes // SLOT_MINUTES
+            if end <= start:
+                # Open for less than one whole slot
+                continue
+            if end > WEEK_SLOTS:
+                intervals.append((start, WEEK_SLOTS))
+                intervals.append((0, end - WEEK_SLOTS))
+            else:
+                intervals.append((start, end))
+
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def slot_at(moment):
+    """Return the week slot a (local) datetime falls in"""
+    return moment.weekday() * SLOTS_PER_DAY + (moment.hour * 60 + moment.minute) // SLOT_MINUTES
+
+
+def load_timezone(name):
+    """Return the ``ZoneInfo`` for ``name``, raising ValueError if it is unknown"""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError) as e:
+        raise ValueError(f'Unknown timezone: {name!r}') from e
+
+
+def requested_slot(open_at=None, open_now=False, tz=timezone.utc):
+    """Return the week slot to test for the ``open_at`` / ``open_now`` filters.
+
+    ``open_at`` is the raw query value and wins over ``open_now``, which is
+    already parsed to a bool. Returns None when neither asks for a filter.
+    Naive ``open_at`` values are read as local time in ``tz``.
+    Raises ValueError for an unparseable ``open_at``.
+    """
+    if open_at:
+        moment = datetime.fromisoformat(open_at.replace('Z', '+00:00'))
+        moment = moment.astimezone(tz) if moment.tzinfo else moment
+        return slot_at(moment)
+    if open_now:
+        return slot_at(datetime.now(tz))
+    return None
+
+
+def register(shop_model, hours_model):
+    """Recompile ``shop_hours`` whenever ``Shop.opening_hours`` is written"""
+    table = hours_model.__table__
+
+    def write_hours(connection, shop):
+        connection.execute(table.delete().where(table.c.shop_id == shop.id))
+        rows = [
+            {'shop_id': shop.id, 'start_slot': start, 'end_slot': end}
+            for start, end in compile_hours(shop.opening_hours)
+        ]
+        if rows:
+            connection.execute(table.insert(), rows)
+
+    @event.listens_for(shop_model, 'after_insert')
+    def compile_new_shop(mapper, connection, shop):
+        if shop.opening_hours:
+            write_hours(connection, shop)
+
+    @event.listens_for(shop_model, 'after_update')
+    def recompile_shop(mapper, connection, shop):
+        if inspect(shop).attrs.opening_hours.history.has_changes():
+            write_hours(connection, shop)
+
+    @event.listens_for(shop_model, 'after_delete')
+    def drop_shop_hours(mapper, connection, shop):
+        connection.execute(table.delete().where(table.c.shop_id == shop.id))
+
+
+def filter_open_at(query, shop_model, hours_model, slot):
+    """Restrict a shop query to shops open during ``slot``"""
+    return query.filter(shop_model.id.in_(
+        select(hours_model.shop_id).where(
+            hours_model.start_slot <= slot,
+            hours_model.end_slot > slot
+        )
+    ))
@@ -0,0 +1,186 @@
+"""
+Per-client rate limiting
+
+Limits are configured per endpoint in ``RATE_LIMITS`` and keyed by client IP
+and, where configured, by JWT identity::
+
+    RATE_LIMITS = {
+        'login': {'ip': '10/minute;burst=5'},
+        'search': {'ip': '60/minute;burst=20', 'identity': '120/minute'}
+    }
+
+Each limit is enforced with GCRA (generic cell rate algorithm), which only
+needs one timestamp per key. The default store keeps those timestamps in a
+bounded in-process LRU; ``RATE_LIMIT_STORAGE_URL=redis://...`` shares them
+between workers through an atomic Lua script. Anything exposing the same
+``hit(key, emission_interval, burst)`` method can stand in for either.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from flask import jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+try:
+    import redis
+except ImportError:  # the shared store is optional
+    redis = None
+
+PERIODS = {
+    'second': 1,
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400
+}
+
+
+def parse_rate(rate):
+    """Parse ``"<count>/<period>[;burst=<n>]"`` into (emission interval, burst)"""
+    limit, _, options = rate.partition(';')
+    count, _, period = limit.strip().partition('/')
+    count = int(count)
+    period = period.strip().rstrip('s')
+    if count <= 0 or period not in PERIODS:
+        raise ValueError(f'Invalid rate limit: {rate}')
+
+    burst = count
+    for option in filter(None, (part.strip() for part in options.split(';'))):
+        name, _, value = option.partition('=')
+        if name.strip() != 'burst':
+            raise ValueError(f'Unknown rate limit option: {option}')
+        burst = int(value)
+    return PERIODS[period] / count, max(burst, 1)
+
+
+class MemoryStore:
+    """GCRA state in a bounded in-process LRU.
+
+    Evicting a key only ever forgets how far ahead a client was, and keys
+    are refreshed on every hit, so the LRU bound is safe to keep small.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._tats = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, emission_interval, burst):
+        """Record one request; returns (allowed, retry_after_seconds)"""
+        now = time.monotonic()
+        with self._lock:
+            tat = max(self._tats.get(key, now), now)
+            new_tat = tat + emission_interval
+            allow_at = new_tat - burst * emission_interval
+            if now < allow_at:
+                return False, allow_at - now
+
+            self._tats[key] = new_tat
+            self._tats.move_to_end(key)
+            if len(self._tats) > self.max_keys:
+                self._tats.popitem(last=False)
+            return True, 0.0
+
+
+GCRA_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local emission = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then tat = now end
+local new_tat = tat + emission
+local allow_at = new_tat - burst * emission
+if now < allow_at then
+    return {0, tostring(allow_at - now)}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, '0'}
+"""
+
+
+class RedisStore:
+    """GCRA state shared between workers through Redis"""
+
+    def __init__(self, client, prefix='ratelimit:'):
+        self.prefix = prefix
+        self._script = client.register_script(GCRA_SCRIPT)
+
+    def hit(self, key, emission_interval, burst):
+        allowed, retry_after = self._script(
+            keys=[self.prefix + key], args=[emission_interval, burst]
+        )
+        return bool(int(allowed)), float(retry_after)
+
+
+def create_store(url, max_keys=100000):
+    """Build a store from ``RATE_LIMIT_STORAGE_URL``"""
+    if not url or url.startswith('memory://'):
+        return MemoryStore(max_keys)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        if redis is None:
+            raise RuntimeError('RATE_LIMIT_STORAGE_URL points at Redis but redis is not installed')
+        return RedisStore(redis.Redis.from_url(url))
+    raise ValueError(f'Unsupported rate limit storage: {url}')
+
+
+class RateLimiter:
+    """before_request hook enforcing the configured per-endpoint limits"""
+
+    def __init__(self, app=None, store=None):
+        self.store = store
+        self.rules = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RATE_LIMIT_ENABLED', True)
+        if self.store is None:
+            self.store = create_store(
+                app.config.get('RATE_LIMIT_STORAGE_URL'),
+                app.config.get('RATE_LIMIT_MAX_KEYS', 100000)
+            )
+        for endpoint, limits in app.config.get('RATE_LIMITS', {}).items():
+            unknown = set(limits) - {'ip', 'identity'}
+            if unknown:
+                raise ValueError(f"Unknown rate limit scope for {endpoint}: {', '.join(sorted(unknown))}")
+        # Parse once so the per-request check is a dict lookup plus one store hit
+        self.rules = {
+            endpoint: {scope: parse_rate(rate) for scope, rate in limits.items()}
+            for endpoint, limits in app.config.get('RATE_LIMITS', {}).items()
+        }
+        app.before_request(self.check)
+
+    def check(self):
+        if not self.enabled or request.method == 'OPTIONS':
+            return None
+        rules = self.rules.get(request.endpoint)
+        if not rules:
+            return None
+
+        for scope, (emission_interval, burst) in rules.items():
+            client = self._client_key(scope)
+            if client is None:
+                continue
+            allowed, retry_after = self.store.hit(
+                f'{request.endpoint}:{scope}:{client}', emission_interval, burst
+            )
+            if not allowed:
+                response = jsonify({'error': 'Too many requests, please slow down'})
+                response.status_code = 429
+                response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+                return response
+        return None
+
+    def _client_key(self, scope):
+        if scope == 'ip':
+            return request.remote_addr or 'unknown'
+        if scope == 'identity':
+            try:
+                verify_jwt_in_request(optional=True)
+                identity = get_jwt_identity()
+            except Exception:
+                return None
+            return None if identity is None else str(identity)
+        return None
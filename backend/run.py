@@ -4,12 +4,13 @@ SuperMall Backend Application Entry Point
 """
 
 import os
+
+# app.py picks its configuration from FLASK_ENV when it is imported
+os.environ.setdefault('FLASK_ENV', 'development')
+
 from app import create_app
-from config import config
 
-# Get configuration from environment
-config_name = os.environ.get('FLASK_ENV', 'development')
-app = create_app(config[config_name])
+app = create_app()
 
 if __name__ == '__main__':
     # Development server
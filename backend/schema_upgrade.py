@@ -0,0 +1,68 @@
+"""
+In-place schema upgrade for existing databases
+
+``db.create_all()`` creates missing tables but never alters existing ones, so
+a database created before a model gained columns fails with "no such
+column". :func:`upgrade` adds every missing column with ``ALTER TABLE ...
+ADD COLUMN``, backfills scalar column defaults into the existing rows, adds
+the missing indexes and finally creates the missing tables.
+
+Added columns are always nullable: SQLite cannot add a ``NOT NULL`` column
+without a server default, and uniqueness is enforced by a unique index
+instead of a column constraint for the same reason.
+"""
+from sqlalchemy import Index, inspect, text
+
+
+def _add_column(connection, table, column):
+    preparer = connection.dialect.identifier_preparer
+    column_type = column.type.compile(dialect=connection.dialect)
+    connection.execute(text(
+        f'ALTER TABLE {preparer.format_table(table)} '
+        f'ADD COLUMN {preparer.format_column(column)} {column_type}'
+    ))
+
+    default = column.default
+    if default is not None and (default.is_scalar or default.is_callable):
+        value = default.arg(None) if default.is_callable else default.arg
+        connection.execute(
+            table.update().where(column.is_(None)).values({column.name: value})
+        )
+
+
+def upgrade(engine, metadata):
+    """Bring an existing database up to ``metadata``; returns the changes made"""
+    changes = []
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        existing_tables = set(inspector.get_table_names())
+
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            present = {column['name'] for column in inspector.get_columns(table.name)}
+            added = [column for column in table.columns if column.name not in present]
+            for column in added:
+                _add_column(connection, table, column)
+                changes.append(f'added column {table.name}.{column.name}')
+
+            present_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if index.name not in present_indexes:
+                    index.create(connection)
+                    changes.append(f'created index {index.name}')
+
+            for column in added:
+                if column.unique:
+                    index = Index(f'uq_{table.name}_{column.name}', column, unique=True)
+                    # Only needed once; keep it out of the table's metadata
+                    table.indexes.discard(index)
+                    index.create(connection)
+                    changes.append(f'created index {index.name}')
+
+    missing = [table for table in metadata.sorted_tables if table.name not in existing_tables]
+    if missing:
+        metadata.create_all(engine, tables=missing)
+        changes.extend(f'created table {table.name}' for table in missing)
+    return changes
@@ -0,0 +1,188 @@
+"""
+Fast JSON serialization
+
+``OrjsonProvider`` is a drop-in Flask JSON provider that builds responses
+with orjson. In compact mode it produces the same bytes as Flask's default
+provider (sorted keys, compact separators, ASCII-only output). Payloads
+orjson would write differently are handed to the default provider instead:
+floats that ``repr`` writes in exponent notation (below 1e-4 or from 1e16
+up), NaN and infinities, and integers outside the 64-bit range. The default
+provider is also used when orjson is not installed and for pretty-printed
+output. The one intended difference is that raw ``datetime`` values become
+ISO 8601, the format every ``to_dict`` already uses, rather than HTTP dates.
+
+``ModelSerializer`` is generated once per model from its column metadata and
+turns plain row tuples into response dicts, so list routes skip loading ORM
+instances and calling ``to_dict`` per row.
+"""
+import re
+from datetime import date, datetime
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import JSON
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib provider is used instead
+    orjson = None
+
+# json.dumps(ensure_ascii=True) escapes DEL as well as non-ASCII characters
+_NON_ASCII = re.compile('[^\x00-\x7e]')
+
+INT_MIN = -(1 << 63)
+UINT_MAX = (1 << 64) - 1
+
+
+def _escape_non_ascii(match):
+    # Same escapes json.dumps(ensure_ascii=True) produces
+    code = ord(match.group())
+    if code < 0x10000:
+        return '\\u%04x' % code
+    code -= 0x10000
+    return '\\u%04x\\u%04x' % (0xd800 | (code >> 10), 0xdc00 | (code & 0x3ff))
+
+
+def _float_differs(value):
+    # repr() switches to exponent notation outside [1e-4, 1e16); orjson
+    # formats those differently and writes NaN / infinities as null
+    return value != value or not (value == 0.0 or 1e-4 <= abs(value) < 1e16)
+
+
+def needs_stdlib(obj):
+    """True when orjson would not reproduce the stdlib encoding of ``obj``"""
+    stack = [obj]
+    while stack:
+        value = stack.pop()
+        kind = type(value)
+        if kind is str or value is None:
+            continue
+        if kind is float:
+            if _float_differs(value):
+                return True
+        elif kind is int:
+            if not INT_MIN <= value <= UINT_MAX:
+                return True
+        elif kind is dict:
+            stack.extend(value.values())
+        elif kind is list or kind is tuple:
+            stack.extend(value)
+        elif kind is SerializedRows:
+            if value.needs_stdlib():
+                return True
+    return False
+
+
+class SerializedRows(list):
+    """Response dicts from a ModelSerializer.
+
+    Only float and JSON columns can hold values orjson writes differently,
+    so the check looks at those fields instead of walking every row.
+    """
+
+    def __init__(self, rows, fields):
+        super().__init__(rows)
+        self.fields = fields
+
+    def needs_stdlib(self):
+        fields = self.fields
+        return bool(fields) and needs_stdlib([row[field] for row in self for field in fields])
+
+
+def _default(value):
+    # Dates come out as ISO 8601 on the stdlib path too, as orjson writes them
+    if isinstance(value, date):
+        return value.isoformat()
+    return DefaultJSONProvider.default(value)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes responses with orjson when it is available"""
+
+    default = staticmethod(_default)
+
+    def _options(self):
+        options = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return options
+
+    def encode(self, obj):
+        """Serialize ``obj`` to compact JSON bytes"""
+        body = orjson.dumps(obj, default=self.default, option=self._options())
+        if self.ensure_ascii and (not body.isascii() or b'\x7f' in body):
+            # Non-ASCII bytes and DEL can only occur inside strings, so
+            # escaping them after the fact is safe
+            body = _NON_ASCII.sub(_escape_non_ascii, body.decode('utf-8')).encode('ascii')
+        return body
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        if orjson is None or pretty:
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        if needs_stdlib(obj):
+            return super().response(obj)
+        return self._app.response_class(self.encode(obj) + b'\n', mimetype=self.mimetype)
+
+
+class ModelSerializer:
+    """Row-tuple serializer compiled from a model's column metadata.
+
+    ``columns`` are the SQL expressions to select (pass them to
+    ``with_entities``); ``row_to_dict`` maps each selected row to the same
+    dict the model's ``to_dict`` returns. ``extra`` adds labelled SQL
+    expressions such as joined columns.
+    """
+
+    def __init__(self, model, exclude=(), extra=None):
+        self.model = model
+        self.columns = []
+        self.fields = []
+        self.checked_fields = []
+        datetime_fields = set()
+
+        for column in model.__table__.columns:
+            if column.name in exclude:
+                continue
+            self.columns.append(getattr(model, column.key))
+            self.fields.append(column.key)
+            if _python_type(column) is datetime:
+                datetime_fields.add(column.key)
+            elif _python_type(column) is float or isinstance(column.type, JSON):
+                # Floats and JSON documents may need the stdlib encoder
+                self.checked_fields.append(column.key)
+
+        for name, expression in (extra or {}).items():
+            self.columns.append(expression.label(name))
+            self.fields.append(name)
+
+        self.row_to_dict = self._compile(datetime_fields)
+
+    def _compile(self, datetime_fields):
+        items = []
+        for index, field in enumerate(self.fields):
+            value = f'row[{index}]'
+            if field in datetime_fields and orjson is None:
+                # Formatting here is faster than via the provider's default()
+                value = f'(row[{index}].isoformat() if row[{index}] else None)'
+            items.append(f'{field!r}: {value}')
+        source = f"lambda row: {{{', '.join(items)}}}"
+        return eval(compile(source, f'<serializer {self.model.__name__}>', 'eval'))
+
+    def serialize(self, rows):
+        """Convert selected rows into response dicts"""
+        row_to_dict = self.row_to_dict
+        return SerializedRows([row_to_dict(row) for row in rows], self.checked_fields)
+
+
+def _python_type(column):
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return None
@@ -0,0 +1,179 @@
+"""
+Precomputed "similar products"
+
+Offline batch job behind ``flask build-similar-products``. Each available
+product becomes a feature vector (category, subcategory, brand, tags, price
+band and shop, hashed into a fixed number of dimensions and L2-normalized),
+top-k neighbours are found with blocked cosine-similarity matrix products,
+and the results are stored in ``product_similarities`` for
+``GET /api/products/<id>/similar`` to read.
+
+Incremental runs only recompute products changed since the last run: those
+get fresh neighbour lists against the whole catalog, and every other list is
+merged with its similarities to the changed products. When a changed product
+drops out of a list the slot is not backfilled until the next ``--full`` run.
+"""
+import math
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+FEATURE_WEIGHTS = {
+    'category': 3.0,
+    'subcategory': 2.0,
+    'brand': 1.5,
+    'tags': 1.0,
+    'price_band': 1.0,
+    'shop': 0.5
+}
+
+
+def price_band(price):
+    """Bucket prices into bands that double in width"""
+    return int(math.log2(max(price or 0, 0) + 1))
+
+
+def _features(product):
+    features = [
+        ('category', product.category),
+        ('subcategory', product.subcategory),
+        ('brand', product.brand),
+        ('price_band', price_band(product.price)),
+        ('shop', product.shop_id)
+    ]
+    tags = product.tags or []
+    for tag in tags:
+        # Spread the tag weight so tag-heavy products don't dominate
+        features.append(('tags', tag, 1.0 / math.sqrt(len(tags))))
+    return features
+
+
+def build_vectors(products, dims):
+    """Return an L2-normalized float32 matrix with one row per product"""
+    matrix = np.zeros((len(products), dims), dtype=np.float32)
+    for row, product in enumerate(products):
+        for feature in _features(product):
+            name, value = feature[0], feature[1]
+            if value is None or value == '':
+                continue
+            scale = feature[2] if len(feature) > 2 else 1.0
+            # crc32 rather than hash() so columns are stable across processes
+            column = zlib.crc32(f'{name}={value}'.lower().encode()) % dims
+            matrix[row, column] += FEATURE_WEIGHTS[name] * scale
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k(queries, query_ids, candidates, candidate_ids, k, block_size):
+    """Yield ``(query_id, [(candidate_id, score), ...])`` best-first.
+
+    Similarities are computed ``block_size`` query rows at a time so memory
+    stays at ``block_size x len(candidates)`` floats.
+    """
+    if len(candidate_ids) == 0:
+        for query_id in query_ids:
+            yield int(query_id), []
+        return
+
+    for offset in range(0, len(query_ids), block_size):
+        block_ids = query_ids[offset:offset + block_size]
+        scores = queries[offset:offset + block_size] @ candidates.T
+        # A product is never its own neighbour
+        scores[block_ids[:, None] == candidate_ids[None, :]] = -np.inf
+
+        limit = min(k, len(candidate_ids))
+        if limit < len(candidate_ids):
+            best = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+        else:
+            best = np.tile(np.arange(limit), (len(block_ids), 1))
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+
+        for row, query_id in enumerate(block_ids):
+            yield int(query_id), [
+                (int(candidate_ids[column]), float(score))
+                for column, score in zip(best[row], best_scores[row])
+                if np.isfinite(score) and score > 0
+            ]
+
+
+def build(session, product_model, similarity_model, run_model,
+          k=10, block_size=512, dims=1024, full=False):
+    """Refresh stored neighbour lists; returns the number of lists written"""
+    Product = product_model
+    Similarity = similarity_model
+    started_at = datetime.utcnow()
+
+    last_run = run_model.query.order_by(run_model.started_at.desc()).first()
+    since = None if full or last_run is None else last_run.started_at
+
+    products = Product.query.filter(Product.is_available == True).order_by(Product.id).all()
+    ids = np.array([product.id for product in products], dtype=np.int64)
+    vectors = build_vectors(products, dims)
+
+    if since is None:
+        changed_mask = np.ones(len(products), dtype=bool)
+    else:
+        changed_mask = np.array(
+            [product.updated_at is not None and product.updated_at > since for product in products],
+            dtype=bool
+        )
+    # Products that were deleted or made unavailable also have to leave every list
+    removed_ids = set()
+    if since is not None:
+        removed_ids = {
+            product_id for (product_id,) in
+            session.query(Product.id).filter(Product.is_available == False, Product.updated_at > since)
+        }
+        stored_ids = {product_id for (product_id,) in session.query(Similarity.product_id).distinct()}
+        removed_ids |= stored_ids - set(ids.tolist())
+
+    lists = {}
+    changed_ids = ids[changed_mask]
+    lists.update(top_k(vectors[changed_mask], changed_ids, vectors, ids, k, block_size))
+
+    unchanged_mask = ~changed_mask
+    if since is not None and unchanged_mask.any() and (len(changed_ids) or removed_ids):
+        stale = set(changed_ids.tolist()) | removed_ids
+        existing = {}
+        stored = session.query(
+            Similarity.product_id, Similarity.similar_product_id, Similarity.score
+        ).order_by(Similarity.product_id, Similarity.rank)
+        for product_id, similar_id, score in stored:
+            existing.setdefault(product_id, []).append((similar_id, score))
+
+        fresh = top_k(vectors[unchanged_mask], ids[unchanged_mask],
+                      vectors[changed_mask], changed_ids, k, block_size)
+        for product_id, neighbours in fresh:
+            current = existing.get(product_id, [])
+            merged = [item for item in current if item[0] not in stale] + neighbours
+            merged.sort(key=lambda item: -item[1])
+            # Only rewrite lists whose neighbours actually changed
+            if [item[0] for item in merged[:k]] != [item[0] for item in current]:
+                lists[product_id] = merged[:k]
+
+    if since is None:
+        session.query(Similarity).delete(synchronize_session=False)
+    else:
+        rewritten = list(lists) + list(removed_ids)
+        for offset in range(0, len(rewritten), 500):
+            session.query(Similarity).filter(
+                Similarity.product_id.in_(rewritten[offset:offset + 500])
+            ).delete(synchronize_session=False)
+
+    rows = [
+        {'product_id': product_id, 'similar_product_id': similar_id, 'score': score, 'rank': rank}
+        for product_id, neighbours in lists.items()
+        for rank, (similar_id, score) in enumerate(neighbours, start=1)
+    ]
+    if rows:
+        session.execute(Similarity.__table__.insert(), rows)
+
+    session.add(run_model(started_at=started_at, finished_at=datetime.utcnow(), products_updated=len(lists)))
+    session.commit()
+    return len(lists)
@@ -0,0 +1,246 @@
+"""
+Catalog snapshot export for analytics
+
+Streams a consistent snapshot of users (without password hashes), shops,
+products, offers and reviews out of the database so analytics never have to
+scrape the public list endpoints. All tables are read inside one read
+transaction in ``yield_per`` batches and written either as zstd-compressed
+Parquet (when ``pyarrow`` is installed) or as gzipped NDJSON chunks.
+
+Incremental exports only include rows whose ``updated_at`` is newer than the
+high-water mark recorded in ``manifest.json`` by the previous export.
+"""
+import gzip
+import json
+import os
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import select
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet output is optional
+    pa = None
+    pq = None
+
+EXCLUDED_COLUMNS = {
+    'users': {'password_hash'}
+}
+
+FORMATS = ('parquet', 'ndjson')
+
+
+def default_format():
+    return 'parquet' if pa is not None else 'ndjson'
+
+
+def export_columns(table):
+    """Columns of ``table`` that may leave the database"""
+    excluded = EXCLUDED_COLUMNS.get(table.name, set())
+    return [column for column in table.columns if column.name not in excluded]
+
+
+@contextmanager
+def snapshot_connection(engine):
+    """Open a connection whose reads all see the same snapshot"""
+    with engine.connect() as connection:
+        if engine.dialect.name == 'sqlite':
+            # pysqlite defers BEGIN until the first write; open the read
+            # transaction explicitly so every table sees the same state
+            connection = connection.execution_options(isolation_level='AUTOCOMMIT')
+            connection.exec_driver_sql('BEGIN')
+            try:
+                yield connection
+            finally:
+                connection.exec_driver_sql('ROLLBACK')
+        else:
+            connection = connection.execution_options(isolation_level='REPEATABLE READ')
+            with connection.begin():
+                yield connection
+
+
+def iter_batches(connection, table, since=None, batch_size=1000):
+    """Yield lists of row dicts from ``table`` in ``yield_per`` batches"""
+    columns = export_columns(table)
+    statement = select(*columns)
+    if since is not None and 'updated_at' in table.columns:
+        statement = statement.where(table.columns.updated_at > since)
+    statement = statement.order_by(*table.primary_key.columns)
+
+    result = connection.execution_options(yield_per=batch_size).execute(statement)
+    for partition in result.partitions():
+        yield [dict(row._mapping) for row in partition]
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'Cannot serialize {type(value).__name__}')
+
+
+def encode_row(row):
+    return json.dumps(row, default=_json_default, separators=(',', ':'))
+
+
+def _arrow_type(column):
+    python_type = None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        pass
+    if python_type is bool:
+        return pa.bool_()
+    if python_type is int:
+        return pa.int64()
+    if python_type is float:
+        return pa.float64()
+    if python_type is datetime:
+        return pa.timestamp('us')
+    return pa.string()
+
+
+def _arrow_batch(schema, rows):
+    columns = {}
+    for field in schema:
+        values = [row[field.name] for row in rows]
+        if pa.types.is_string(field.type):
+            # JSON columns (tags, opening_hours, ...) are stored as JSON text
+            values = [
+                value if value is None or isinstance(value, str) else json.dumps(value)
+                for value in values
+            ]
+        columns[field.name] = values
+    return pa.Table.from_pydict(columns, schema=schema)
+
+
+def _write_parquet(table, batches, path):
+    schema = pa.schema([(column.name, _arrow_type(column)) for column in export_columns(table)])
+    rows_written = 0
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        for rows in batches:
+            writer.write_table(_arrow_batch(schema, rows))
+            rows_written += len(rows)
+    return [os.path.basename(path)], rows_written
+
+
+def _write_ndjson(table, batches, directory, chunk_rows):
+    files = []
+    rows_written = 0
+    handle = None
+    rows_in_chunk = 0
+    try:
+        for rows in batches:
+            for row in rows:
+                if handle is None or rows_in_chunk >= chunk_rows:
+                    if handle is not None:
+                        handle.close()
+                    name = f'{table.name}-{len(files):05d}.ndjson.gz'
+                    handle = gzip.open(os.path.join(directory, name), 'wt', encoding='utf-8')
+                    files.append(name)
+                    rows_in_chunk = 0
+                handle.write(encode_row(row))
+                handle.write('\n')
+                rows_in_chunk += 1
+            rows_written += len(rows)
+    finally:
+        if handle is not None:
+            handle.close()
+    return files, rows_written
+
+
+def _track_high_water_mark(batches, state):
+    for rows in batches:
+        for row in rows:
+            updated_at = row.get('updated_at')
+            if updated_at is not None and (state['mark'] is None or updated_at > state['mark']):
+                state['mark'] = updated_at
+        yield rows
+
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, 'manifest.json')
+    if not os.path.exists(path):
+        return {'exports': [], 'high_water_marks': {}}
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def export_snapshot(engine, tables, out_dir, incremental=False, fmt=None,
+                    batch_size=1000, chunk_rows=100000):
+    """Export ``tables`` into a new timestamped directory under ``out_dir``.
+
+    Returns the manifest entry describing the export. Raises
+    FileExistsError rather than reuse an existing export directory.
+    """
+    fmt = fmt or default_format()
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(FORMATS)}")
+    if fmt == 'parquet' and pa is None:
+        raise ValueError('Parquet export requires pyarrow to be installed')
+
+    manifest = load_manifest(out_dir)
+    marks = manifest['high_water_marks']
+    started_at = datetime.utcnow()
+    # Microseconds keep back-to-back exports apart; never write into an
+    # existing export's directory
+    directory = os.path.join(out_dir, started_at.strftime('%Y%m%dT%H%M%S%f'))
+    os.makedirs(out_dir, exist_ok=True)
+    os.mkdir(directory)
+
+    entry = {
+        'directory': os.path.basename(directory),
+        'started_at': started_at.isoformat(),
+        'incremental': incremental,
+        'format': fmt,
+        'tables': {}
+    }
+    with snapshot_connection(engine) as connection:
+        for table in tables:
+            since = None
+            if incremental and marks.get(table.name):
+                since = datetime.fromisoformat(marks[table.name])
+
+            state = {'mark': since}
+            batches = _track_high_water_mark(
+                iter_batches(connection, table, since, batch_size), state
+            )
+            if fmt == 'parquet':
+                files, rows = _write_parquet(table, batches, os.path.join(directory, f'{table.name}.parquet'))
+            else:
+                files, rows = _write_ndjson(table, batches, directory, chunk_rows)
+
+            if state['mark'] is not None:
+                marks[table.name] = state['mark'].isoformat()
+            entry['tables'][table.name] = {
+                'rows': rows,
+                'files': files,
+                'since': since.isoformat() if since else None
+            }
+
+    entry['finished_at'] = datetime.utcnow().isoformat()
+    manifest['exports'].append(entry)
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as handle:
+        json.dump(manifest, handle, indent=2)
+    return entry
+
+
+def stream_ndjson_gzip(engine, tables, since=None, batch_size=1000):
+    """Yield a gzip stream of ``{"table": ..., "data": {...}}`` lines.
+
+    Used by the admin endpoint; all tables come from one snapshot.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    with snapshot_connection(engine) as connection:
+        for table in tables:
+            for rows in iter_batches(connection, table, since, batch_size):
+                lines = ''.join(
+                    encode_row({'table': table.name, 'data': row}) + '\n'
+                    for row in rows
+                )
+                chunk = compressor.compress(lines.encode('utf-8'))
+                if chunk:
+                    yield chunk
+    yield compressor.flush()
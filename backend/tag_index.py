@@ -0,0 +1,185 @@
+"""
+Inverted tag index for products
+
+``Product.tags`` stays the source of truth (a JSON array on the row); a
+normalized ``product_tags`` posting table keyed by ``(tag, product_id)`` is
+kept in sync from mapper events so tag filters run inside the database.
+``tag_counts`` holds the length of every posting list, maintained by the
+same events, so "all tags" queries can pick the rarest tag without
+counting posting lists at query time.
+"""
+from sqlalchemy import event, exists, func, inspect, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import aliased
+
+TAG_MODES = ('all', 'any')
+
+# ProductTag.tag is String(50)
+MAX_TAG_LENGTH = 50
+
+
+def normalize_tags(tags):
+    """Lower-case, strip and de-duplicate a list of tags, keeping order.
+
+    Lenient, for data already stored: a bare string is one tag, and entries
+    that are not strings or do not fit the index are skipped.
+    """
+    if isinstance(tags, str):
+        tags = [tags]
+    seen = []
+    for tag in tags or []:
+        if not isinstance(tag, str):
+            continue
+        tag = tag.strip().lower()
+        if tag and len(tag) <= MAX_TAG_LENGTH and tag not in seen:
+            seen.append(tag)
+    return seen
+
+
+def validate_tags(tags):
+    """Normalize tags from a request, raising ValueError for bad input"""
+    if tags is None:
+        return []
+    if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        raise ValueError('tags must be a list of strings')
+    if any(len(tag.strip()) > MAX_TAG_LENGTH for tag in tags):
+        raise ValueError(f'tags must be at most {MAX_TAG_LENGTH} characters long')
+    return normalize_tags(tags)
+
+
+def parse_tag_args(args):
+    """Read ``tags`` and ``tag_mode`` from request args.
+
+    Raises ValueError for an unknown mode or an over-long tag.
+    """
+    tags = validate_tags((args.get('tags') or '').split(','))
+    mode = args.get('tag_mode', 'all')
+    if mode not in TAG_MODES:
+        raise ValueError(f"tag_mode must be one of: {', '.join(TAG_MODES)}")
+    return tags, mode
+
+
+def _adjust_counts(connection, counts, tags, delta):
+    if not tags:
+        return
+    if delta < 0:
+        connection.execute(
+            counts.update()
+            .where(counts.c.tag.in_(tags))
+            .values(product_count=counts.c.product_count + delta)
+        )
+        return
+
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        statement = insert(counts).values([{'tag': tag, 'product_count': delta} for tag in tags])
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=[counts.c.tag],
+            set_={'product_count': counts.c.product_count + delta}
+        ))
+        return
+
+    existing = set(connection.execute(select(counts.c.tag).where(counts.c.tag.in_(tags))).scalars())
+    if existing:
+        connection.execute(
+            counts.update()
+            .where(counts.c.tag.in_(existing))
+            .values(product_count=counts.c.product_count + delta)
+        )
+    missing = [tag for tag in tags if tag not in existing]
+    if missing:
+        connection.execute(counts.insert(), [{'tag': tag, 'product_count': delta} for tag in missing])
+
+
+def register(product_model, tag_model, count_model):
+    """Keep the posting and count tables in step with ``Product.tags`` on every flush"""
+    postings = tag_model.__table__
+    counts = count_model.__table__
+
+    def indexed_tags(connection, product_id):
+        return set(connection.execute(
+            select(postings.c.tag).where(postings.c.product_id == product_id)
+        ).scalars())
+
+    def write_postings(connection, product, previous=()):
+        tags = normalize_tags(product.tags)
+        removed = [tag for tag in previous if tag not in tags]
+        added = [tag for tag in tags if tag not in previous]
+        if removed:
+            connection.execute(postings.delete().where(
+                postings.c.product_id == product.id, postings.c.tag.in_(removed)
+            ))
+            _adjust_counts(connection, counts, removed, -1)
+        if added:
+            connection.execute(postings.insert(), [
+                {'tag': tag, 'product_id': product.id} for tag in added
+            ])
+            _adjust_counts(connection, counts, added, 1)
+
+    @event.listens_for(product_model, 'after_insert')
+    def index_new_product(mapper, connection, product):
+        if product.tags:
+            write_postings(connection, product)
+
+    @event.listens_for(product_model, 'after_update')
+    def reindex_product(mapper, connection, product):
+        if inspect(product).attrs.tags.history.has_changes():
+            write_postings(connection, product, indexed_tags(connection, product.id))
+
+    @event.listens_for(product_model, 'after_delete')
+    def unindex_product(mapper, connection, product):
+        removed = indexed_tags(connection, product.id)
+        connection.execute(postings.delete().where(postings.c.product_id == product.id))
+        _adjust_counts(connection, counts, list(removed), -1)
+
+
+def filter_by_tags(query, session, product_model, tag_model, count_model, tags, mode='all'):
+    """Restrict a product query to products carrying ``tags``"""
+    if not tags:
+        return query
+
+    if mode == 'any':
+        return query.filter(product_model.id.in_(
+            select(tag_model.product_id).where(tag_model.tag.in_(tags))
+        ))
+
+    # Drive the intersection from the smallest posting list and probe the
+    # (tag, product_id) primary key for the others, so the cost tracks the
+    # rarest tag rather than the most common one. Sizes come from
+    # tag_counts by primary key; an unknown tag sorts first and ends the
+    # intersection immediately.
+    sizes = dict(
+        session.query(count_model.tag, count_model.product_count)
+        .filter(count_model.tag.in_(tags))
+        .all()
+    )
+    ordered = sorted(tags, key=lambda tag: sizes.get(tag, 0))
+    driver = aliased(tag_model)
+    candidates = select(driver.product_id).where(driver.tag == ordered[0])
+    for tag in ordered[1:]:
+        probe = aliased(tag_model)
+        candidates = candidates.where(
+            exists().where(probe.tag == tag, probe.product_id == driver.product_id)
+        )
+    return query.filter(product_model.id.in_(candidates))
+
+
+def rebuild(session, product_model, tag_model, count_model):
+    """Rebuild the posting and count tables from ``Product.tags``"""
+    postings = tag_model.__table__
+    counts = count_model.__table__
+    session.execute(postings.delete())
+    session.execute(counts.delete())
+    rows = [
+        {'tag': tag, 'product_id': product_id}
+        for product_id, tags in session.query(product_model.id, product_model.tags)
+        for tag in normalize_tags(tags)
+    ]
+    if rows:
+        session.execute(postings.insert(), rows)
+        session.execute(counts.insert().from_select(
+            ['tag', 'product_count'],
+            select(postings.c.tag, func.count()).group_by(postings.c.tag)
+        ))
+    session.commit()
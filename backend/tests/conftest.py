@@ -0,0 +1,55 @@
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app.py reads its configuration at import time
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ.setdefault('OFFER_SCHEDULER_ENABLED', '0')
+os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+
+
+@pytest.fixture(scope='session')
+def backend():
+    import app as backend
+
+    with backend.app.app_context():
+        backend.db.create_all()
+    return backend
+
+
+@pytest.fixture
+def client(backend):
+    return backend.app.test_client()
+
+
+_user_numbers = itertools.count()
+
+
+@pytest.fixture
+def register_user(client):
+    """Register users with unique emails; returns ``(user, auth headers)``"""
+    def register(role='customer'):
+        body = client.post('/api/auth/register', json={
+            'name': 'User', 'email': f'user-{next(_user_numbers)}@example.com',
+            'password': 'secret', 'role': role
+        }).get_json()
+        return body['user'], {'Authorization': f"Bearer {body['access_token']}"}
+    return register
+
+
+@pytest.fixture
+def owner_headers(register_user):
+    return register_user('shop_owner')[1]
+
+
+@pytest.fixture
+def shop(client, owner_headers):
+    """A shop owned by the ``owner_headers`` user"""
+    return client.post('/api/shops', headers=owner_headers, json={
+        'name': 'Shop', 'category': 'food', 'location': 'Mall', 'address': '1 Main'
+    }).get_json()['shop']
@@ -0,0 +1,75 @@
+"""Adaptive admission control: the AIMD limit, shedding and deadlines"""
+from types import SimpleNamespace
+
+import pytest
+from flask import g
+
+import admission
+from admission import AdaptiveLimit
+
+
+def test_limit_grows_additively_and_backs_off_multiplicatively():
+    limit = AdaptiveLimit(initial=10, minimum=4, maximum=12, backoff=0.5)
+    assert all(limit.try_acquire(0.4) for _ in range(4))
+    assert not limit.try_acquire(0.4)
+    assert limit.try_acquire(1.0)
+
+    limit.release(latency=0.1, target_latency=0.5)
+    assert limit.limit == pytest.approx(10.1)
+    limit.release(latency=1.0, target_latency=0.5)
+    assert limit.limit == pytest.approx(5.05)
+    # One back-off per target window
+    limit.release(latency=1.0, target_latency=0.5)
+    assert limit.limit == pytest.approx(5.05)
+    assert limit.in_flight == 2
+
+    limit._last_decrease = 0.0
+    limit.release(latency=1.0, target_latency=0.5)
+    assert limit.limit == 4
+
+
+def test_expired_read_deadline_is_a_503(backend, client, monkeypatch):
+    monkeypatch.setitem(backend.admission_control.classes['read'], 'deadline', -1.0)
+    response = client.get('/api/shops')
+    assert response.status_code == 503
+    assert int(response.headers['Retry-After']) >= 1
+
+
+def test_saturated_limit_sheds_reads_but_not_health(backend, client, monkeypatch):
+    saturated = AdaptiveLimit(initial=1, minimum=1, maximum=1)
+    assert saturated.try_acquire(1.0)
+    monkeypatch.setattr(backend.admission_control, 'limit', saturated)
+
+    response = client.get('/api/shops')
+    assert response.status_code == 503
+    assert 'Retry-After' in response.headers
+    assert client.get('/api/health').status_code == 200
+
+
+def test_postgresql_timeout_is_set_once_per_transaction(backend, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(admission.time, 'monotonic', lambda: now[0])
+    executed = []
+    cursor = SimpleNamespace(execute=executed.append)
+    transaction = [object()]
+    conn = SimpleNamespace(
+        dialect=SimpleNamespace(name='postgresql'), info={},
+        get_transaction=lambda: transaction[0]
+    )
+
+    def run_statement():
+        admission.apply_statement_deadline(conn, cursor, 'SELECT 1', {}, None, False)
+
+    with backend.app.test_request_context('/'):
+        g.deadline = now[0] + 4.0
+        run_statement()
+        run_statement()
+        assert executed == ['SET LOCAL statement_timeout = 4000']
+
+        now[0] += 2.5  # more than half the budget gone
+        run_statement()
+        run_statement()
+        transaction[0] = object()
+        run_statement()
+        assert executed[1:] == ['SET LOCAL statement_timeout = 1500'] * 2
+
@@ -0,0 +1,14 @@
+"""POST /api/batch answers bad sub-requests per item"""
+
+
+def test_malformed_items_get_their_own_400(client):
+    response = client.post('/api/batch', json={'requests': [
+        {'path': 5},
+        {'path': '/api/health', 'method': ['GET']},
+        'not an object',
+        {'path': '/api/health'}
+    ]})
+    assert response.status_code == 200
+    assert [(item['path'], item['status']) for item in response.get_json()['responses']] == [
+        (5, 400), ('/api/health', 400), ('', 400), ('/api/health', 200)
+    ]
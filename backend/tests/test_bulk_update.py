@@ -0,0 +1,26 @@
+"""PATCH /api/shops/<id>/products reports bad items per item instead of failing the batch"""
+
+
+def test_invalid_ids_and_skus_are_reported_per_item(client, owner_headers, shop):
+    product = client.post('/api/products', headers=owner_headers, json={
+        'name': 'Tea', 'price': 2.0, 'category': 'food', 'shop_id': shop['id'], 'sku': 'BULK-TEA'
+    }).get_json()['product']
+
+    response = client.patch(f"/api/shops/{shop['id']}/products", headers=owner_headers, json={'products': [
+        {'id': [product['id']], 'price': 1},
+        {'id': str(product['id']), 'price': 1},
+        {'id': True, 'price': 1},
+        {'sku': 5, 'price': 1},
+        {'sku': ['BULK-TEA'], 'price': 1},
+        {'id': product['id'], 'price': 3.5},
+        {'sku': 'BULK-TEA', 'stock_quantity': 7}
+    ]})
+
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [result['status'] for result in results] == ['invalid'] * 5 + ['updated'] * 2
+    assert results[0]['error'] == 'id must be an integer'
+    assert results[3]['error'] == 'sku must be a string'
+
+    listed = client.get(f"/api/products?shop_id={shop['id']}").get_json()['products']
+    assert (listed[0]['price'], listed[0]['stock_quantity']) == (3.5, 7)
@@ -0,0 +1,71 @@
+"""Review group commit: coalesced batches, missing shops and timeouts"""
+import threading
+
+import pytest
+
+from group_commit import ReviewGroupCommitter, ShopNotFound
+
+
+@pytest.fixture
+def committer(backend):
+    return ReviewGroupCommitter(backend.app, backend.db, backend.Review, backend.Shop, window=0.2)
+
+
+def submit_concurrently(committer, reviews):
+    outcomes = [None] * len(reviews)
+
+    def submit(index):
+        try:
+            outcomes[index] = committer.submit(reviews[index])
+        except Exception as e:
+            outcomes[index] = e
+
+    threads = [threading.Thread(target=submit, args=(index,)) for index in range(len(reviews))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def test_concurrent_reviews_share_one_transaction(backend, register_user, shop, committer, monkeypatch):
+    batches = []
+    write = committer._write
+    monkeypatch.setattr(committer, '_write', lambda batch: batches.append(len(batch)) or write(batch))
+
+    user, _ = register_user()
+    reviews = [{'rating': rating, 'comment': '', 'user_id': user['id'], 'shop_id': shop['id']} for rating in (5, 4, 3)]
+    reviews.append({'rating': 5, 'comment': '', 'user_id': user['id'], 'shop_id': 424242})
+    outcomes = submit_concurrently(committer, reviews)
+
+    assert batches == [4]
+    assert sorted(outcome['rating'] for outcome in outcomes[:3]) == [3, 4, 5]
+    assert isinstance(outcomes[3], ShopNotFound)
+    with backend.app.app_context():
+        saved = backend.db.session.get(backend.Shop, shop['id'])
+        assert (saved.rating, saved.total_reviews) == (4.0, 3)
+        assert backend.Review.query.filter_by(shop_id=424242).count() == 0
+
+
+def test_review_for_missing_shop_is_404(backend, client, register_user, monkeypatch):
+    monkeypatch.setitem(backend.app.config, 'REVIEW_GROUP_COMMIT', True)
+    _, headers = register_user()
+    response = client.post('/api/reviews', headers=headers, json={'rating': 5, 'shop_id': 424242})
+    assert response.status_code == 404
+    with backend.app.app_context():
+        assert backend.Review.query.filter_by(shop_id=424242).count() == 0
+
+
+def test_timed_out_review_is_cancelled(backend, register_user, shop, committer):
+    user, _ = register_user()
+    fields = {'rating': 4, 'comment': '', 'user_id': user['id'], 'shop_id': shop['id']}
+
+    # Gives up while the writer is still gathering the batch
+    with pytest.raises(TimeoutError):
+        committer.submit(dict(fields, comment='timed out'), timeout=0.01)
+
+    saved = committer.submit(dict(fields, comment='retried'))
+    assert saved['comment'] == 'retried'
+    with backend.app.app_context():
+        comments = [review.comment for review in backend.Review.query.filter_by(shop_id=shop['id'])]
+    assert comments == ['retried']
@@ -0,0 +1,67 @@
+"""Offer status without a scheduler in the web process, and schema upgrades"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, create_engine, inspect
+
+import schema_upgrade
+
+
+def test_stale_statuses_are_guarded_and_swept(backend, client, shop):
+    now = datetime.utcnow()
+    with backend.app.app_context():
+        # Statuses as a web worker left them with OFFER_SCHEDULER_ENABLED=0
+        ended = backend.Offer(
+            title='Ended', offer_type='percentage', shop_id=shop['id'], status='live',
+            start_date=now - timedelta(days=2), end_date=now - timedelta(days=1)
+        )
+        started = backend.Offer(
+            title='Started', offer_type='percentage', shop_id=shop['id'], status='scheduled',
+            start_date=now - timedelta(hours=1), end_date=now + timedelta(days=1)
+        )
+        backend.db.session.add_all([ended, started])
+        backend.db.session.commit()
+        ids = ended.id, started.id
+
+    def listed():
+        offers = client.get(f"/api/offers?shop_id={shop['id']}").get_json()['offers']
+        return {offer['title'] for offer in offers}
+
+    assert listed() == set()
+
+    assert backend.offer_scheduler.sweep_due() >= 2
+    with backend.app.app_context():
+        assert [backend.db.session.get(backend.Offer, offer_id).status for offer_id in ids] == ['expired', 'live']
+    assert listed() == {'Started'}
+
+
+def test_upgrade_adds_missing_columns(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    old = MetaData()
+    Table('offers', old, Column('id', Integer, primary_key=True), Column('title', String(100)))
+    old.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(old.tables['offers'].insert(), [{'title': 'Existing'}])
+
+    new = MetaData()
+    offers = Table(
+        'offers', new,
+        Column('id', Integer, primary_key=True),
+        Column('title', String(100)),
+        Column('used_count', Integer, default=0),
+        Column('status', String(20), default='scheduled', index=True),
+        Column('sku', String(50), unique=True),
+        Column('updated_at', DateTime, default=datetime.utcnow)
+    )
+    Table('offer_redemptions', new, Column('id', Integer, primary_key=True))
+
+    changes = schema_upgrade.upgrade(engine, new)
+    assert 'added column offers.status' in changes
+    assert 'created table offer_redemptions' in changes
+    assert schema_upgrade.upgrade(engine, new) == []
+
+    with engine.connect() as connection:
+        row = connection.execute(offers.select()).one()
+    assert (row.used_count, row.status, row.sku) == (0, 'scheduled', None)
+    assert row.updated_at is not None
+    indexes = {index['name']: index['unique'] for index in inspect(engine).get_indexes('offers')}
+    assert indexes == {'ix_offers_status': False, 'uq_offers_sku': True}
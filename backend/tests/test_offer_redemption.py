@@ -0,0 +1,23 @@
+"""POST /api/offers/<id>/redeem counts each user at most once"""
+from datetime import datetime, timedelta
+
+
+def test_each_user_redeems_once(client, register_user, owner_headers, shop):
+    now = datetime.utcnow()
+    offer = client.post('/api/offers', headers=owner_headers, json={
+        'title': 'Two only', 'offer_type': 'percentage', 'shop_id': shop['id'], 'usage_limit': 2,
+        'start_date': (now - timedelta(days=1)).isoformat(), 'end_date': (now + timedelta(days=1)).isoformat()
+    }).get_json()['offer']
+    path = f"/api/offers/{offer['id']}/redeem"
+
+    first = register_user()[1]
+    assert client.post(path, headers=first).status_code == 200
+    repeat = client.post(path, headers=first)
+    assert repeat.status_code == 409
+    assert repeat.get_json()['error'] == 'You have already redeemed this offer'
+
+    second = client.post(path, headers=register_user()[1])
+    assert second.get_json()['redemption'] == {
+        'offer_id': offer['id'], 'shop_id': shop['id'], 'used_count': 2, 'remaining': 0
+    }
+    assert client.post(path, headers=register_user()[1]).status_code == 409
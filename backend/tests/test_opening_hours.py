@@ -0,0 +1,56 @@
+"""Opening hours compile to whole slots inside the stated hours"""
+import pytest
+
+import opening_hours
+
+DAY = opening_hours.SLOTS_PER_DAY
+
+
+def test_rounds_opening_up_and_closing_down():
+    # 09:10 opens in the 09:15 slot, 17:50 closes after the 17:30 slot
+    assert opening_hours.compile_hours({'mon': '09:10-17:50'}) == [(37, 71)]
+    assert opening_hours.compile_hours({'mon': '09:00-17:45'}) == [(36, 71)]
+
+
+def test_overnight_and_short_ranges():
+    assert opening_hours.compile_hours({'sun': '22:10-02:00'}) == [(0, 8), (6 * DAY + 89, 7 * DAY)]
+    # Open for less than a whole slot: never reported open
+    assert opening_hours.compile_hours({'tue': '09:05-09:14'}) == []
+    assert opening_hours.compile_hours({'wed': '24h'}) == [(2 * DAY, 3 * DAY)]
+
+
+def test_unknown_timezone_is_a_value_error():
+    assert opening_hours.load_timezone('Europe/Paris').key == 'Europe/Paris'
+    with pytest.raises(ValueError, match='Unknown timezone'):
+        opening_hours.load_timezone('Mars/Olympus_Mons')
+
+
+@pytest.fixture
+def hours_shop(client, owner_headers):
+    return client.post('/api/shops', headers=owner_headers, json={
+        'name': 'Bakery hours', 'category': 'food', 'location': 'Mall', 'address': '1 Main',
+        'opening_hours': {'mon': '09:10-17:50', 'sat': 'closed'}
+    }).get_json()['shop']
+
+
+@pytest.mark.parametrize('open_at, listed', [
+    ('2026-10-19T09:20:00', True),    # Monday, inside the hours
+    ('2026-10-19T09:05:00', False),   # before opening
+    ('2026-10-19T17:48:00', False),   # the 17:45 slot closes at 17:50
+    ('2026-10-24T12:00:00', False),   # Saturday, closed
+    ('2026-10-19T12:00:00+02:00', True)  # 10:00 in SHOP_TIMEZONE (UTC)
+])
+def test_open_at_filters_shops(client, hours_shop, open_at, listed):
+    shops = client.get('/api/shops', query_string={'open_at': open_at}).get_json()['shops']
+    assert (hours_shop['id'] in [shop['id'] for shop in shops]) is listed
+
+    results = client.get('/api/search', query_string={'q': 'Bakery hours', 'open_at': open_at}).get_json()
+    assert (hours_shop['id'] in [shop['id'] for shop in results['shops']]) is listed
+
+
+@pytest.mark.parametrize('query, status', [
+    ('open_now=yes', 400), ('open_now=1', 200), ('open_now=false', 200), ('open_at=soon', 400)
+])
+def test_open_filters_reject_bad_values(client, query, status):
+    assert client.get(f'/api/shops?{query}').status_code == status
+    assert client.get(f'/api/search?q=x&{query}').status_code == status
@@ -0,0 +1,119 @@
+"""OrjsonProvider and ModelSerializer must match Flask's default provider byte for byte"""
+import math
+from datetime import datetime, timedelta
+
+import pytest
+from flask.json.provider import DefaultJSONProvider
+
+from serializers import SerializedRows
+
+EDGE_VALUES = [
+    'plain', '\x7f', '\x00\x1f\n', 'caf\xe9', ' ', '\U0001f600', '"\\/',
+    0, -1, 2 ** 63, -(2 ** 63), 2 ** 64 - 1, 2 ** 64, -(2 ** 63) - 1, 10 ** 30,
+    0.0, -0.0, 0.1, 1 / 3, 12.5, 1e-4, 9.999e-5, 1e-5, 1e-7, 5e-324,
+    1e15, 9999999999999998.0, 1e16, 1e22, 1.7976931348623157e308,
+    math.nan, math.inf, -math.inf,
+    True, False, None, [], {}, {'b': 1, 'a': [1e16, {'c': '\x7f'}]}
+]
+
+
+def default_body(app, obj):
+    return DefaultJSONProvider(app).response(obj).get_data()
+
+
+@pytest.mark.parametrize('value', EDGE_VALUES, ids=repr)
+def test_edge_values_match_default_provider(backend, value):
+    app = backend.app
+    assert app.json.response({'value': value}).get_data() == default_body(app, {'value': value})
+
+
+@pytest.mark.parametrize('value', [1e-5, 1e17, math.nan, ['x', 1e-7], {'n': 2 ** 70}], ids=repr)
+def test_serialized_rows_check_their_float_and_json_fields(backend, value):
+    app = backend.app
+    rows = SerializedRows([{'id': 1, 'value': 1.5}, {'id': 2, 'value': value}], ['value'])
+    assert app.json.response({'rows': rows}).get_data() == default_body(app, {'rows': list(rows)})
+
+
+@pytest.fixture(scope='module')
+def catalog(backend):
+    db = backend.db
+    now = datetime.utcnow()
+    with backend.app.app_context():
+        owner = backend.User(name='Owner', email='owner@example.com', password_hash='x', role='shop_owner')
+        db.session.add(owner)
+        db.session.flush()
+
+        shops = [
+            backend.Shop(name='Caf\xe9 \x7f', category='food', location='Mall', address='1 Main',
+                         owner_id=owner.id, rating=4.25, latitude=1e-5, longitude=1e16),
+            backend.Shop(name='Plain', category='tech', location='Mall', address='2 Main',
+                         owner_id=owner.id, rating=0.1, latitude=51.5, longitude=-0.12)
+        ]
+        db.session.add_all(shops)
+        db.session.flush()
+
+        prices = [12.5, 1e-7, 1e17, 0.1, 9.999e-5]
+        db.session.add_all([
+            backend.Product(name=f'Item {index} ☃', description='caf\xe9', price=price,
+                            category='food', shop_id=shops[index % 2].id, stock_quantity=index,
+                            tags=['vegan', 'x' * index])
+            for index, price in enumerate(prices)
+        ])
+
+        for index, discount in enumerate([10.0, 1e-5, 1e16]):
+            offer = backend.Offer(title=f'Offer {index}', offer_type='percentage', shop_id=shops[0].id,
+                                  discount_percentage=discount, start_date=now - timedelta(days=1),
+                                  end_date=now + timedelta(days=1))
+            offer.status = offer.compute_status()
+            db.session.add(offer)
+        db.session.commit()
+
+
+def expected_body(backend, key, model, body):
+    # Rebuild the route's payload from to_dict() in the order the route returned it
+    with backend.app.app_context():
+        ids = [item['id'] for item in backend.app.json.loads(body)[key]]
+        objects = {obj.id: obj for obj in model.query.filter(model.id.in_(ids))}
+        return [objects[id_].to_dict() for id_ in ids]
+
+
+@pytest.mark.parametrize('path, key, model_name', [
+    ('/api/shops', 'shops', 'Shop'),
+    ('/api/products', 'products', 'Product'),
+    ('/api/offers', 'offers', 'Offer')
+])
+def test_list_routes_match_to_dict(backend, client, catalog, path, key, model_name):
+    response = client.get(path)
+    assert response.status_code == 200
+
+    body = response.get_data()
+    items = expected_body(backend, key, getattr(backend, model_name), body)
+    assert items
+    assert body == default_body(backend.app, {key: items})
+
+
+def test_search_matches_to_dict(backend, client, catalog):
+    response = client.get('/api/search?q=caf')
+    assert response.status_code == 200
+
+    body = response.get_data()
+    expected = {
+        'shops': expected_body(backend, 'shops', backend.Shop, body),
+        'products': expected_body(backend, 'products', backend.Product, body)
+    }
+    assert expected['shops'] and expected['products']
+    assert body == default_body(backend.app, expected)
+
+
+def test_shop_page_reviews_match_to_dict(backend, client, register_user, shop):
+    _, headers = register_user()
+    for rating, comment in ((5, 'caf\xe9 \x7f'), (3, '')):
+        client.post('/api/reviews', headers=headers, json={'rating': rating, 'comment': comment, 'shop_id': shop['id']})
+
+    response = client.get(f"/api/shops/{shop['id']}/page")
+    assert response.status_code == 200
+    recent = response.get_json()['reviews']['recent']
+    with backend.app.app_context():
+        expected = [backend.db.session.get(backend.Review, review['id']).to_dict() for review in recent]
+    assert len(recent) == 2
+    assert recent == expected
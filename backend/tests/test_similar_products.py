@@ -0,0 +1,80 @@
+"""Similar products: top-k, incremental merges and the similar route"""
+import numpy as np
+import pytest
+
+import similar_products
+
+
+def test_top_k_is_best_first_and_skips_self():
+    vectors = np.array([[1, 0], [0.8, 0.6], [0.6, 0.8], [0, 1]], dtype=np.float32)
+    ids = np.array([10, 11, 12, 13], dtype=np.int64)
+    lists = dict(similar_products.top_k(vectors, ids, vectors, ids, k=2, block_size=3))
+
+    assert [neighbour for neighbour, _ in lists[10]] == [11, 12]
+    assert [neighbour for neighbour, _ in lists[13]] == [12, 11]
+    # Orthogonal vectors score 0 and are never listed
+    assert [neighbour for neighbour, _ in dict(
+        similar_products.top_k(vectors[:1], ids[:1], vectors[3:], ids[3:], k=2, block_size=1)
+    )[10]] == []
+
+
+@pytest.fixture
+def lamps(backend, shop):
+    with backend.app.app_context():
+        products = [
+            backend.Product(name=name, price=20.0, category=category, brand=brand, tags=tags, shop_id=shop['id'])
+            for name, category, brand, tags in [
+                ('Desk lamp', 'simlamp', 'Lumo', ['desk']),
+                ('Desk lamp twin', 'simlamp', 'Lumo', ['desk']),
+                ('Floor lamp', 'simlamp', 'Other', None),
+                ('Sofa', 'simsofa', 'Comfy', None)
+            ]
+        ]
+        backend.db.session.add_all(products)
+        backend.db.session.commit()
+        return [product.id for product in products]
+
+
+def test_incremental_builds_update_and_drop_neighbours(backend, lamps):
+    lamp, twin, floor, sofa = lamps
+    db = backend.db
+
+    def build(full=False):
+        similar_products.build(
+            db.session, backend.Product, backend.ProductSimilarity, backend.SimilarityRun,
+            k=2, block_size=2, dims=256, full=full
+        )
+
+    def neighbours(product_id):
+        rows = backend.ProductSimilarity.query.filter_by(product_id=product_id).order_by(backend.ProductSimilarity.rank)
+        return [row.similar_product_id for row in rows]
+
+    def update(product_id, **values):
+        product = db.session.get(backend.Product, product_id)
+        for name, value in values.items():
+            setattr(product, name, value)
+        db.session.commit()
+
+    with backend.app.app_context():
+        build(full=True)
+        assert neighbours(lamp) == [twin, floor]
+
+        # The sofa becomes another desk lamp and displaces the floor lamp
+        update(sofa, category='simlamp', brand='Lumo', tags=['desk'])
+        build()
+        assert set(neighbours(lamp)) == {twin, sofa}
+        assert set(neighbours(sofa)) == {lamp, twin}
+
+        update(twin, is_available=False)
+        build()
+        assert neighbours(lamp) == [sofa]
+        assert twin not in neighbours(sofa)
+        assert neighbours(twin) == []
+
+
+@pytest.mark.parametrize('limit, status', [('-1', 400), ('0', 400), ('11', 400), ('1', 200)])
+def test_similar_limit_is_bounded(backend, client, lamps, limit, status):
+    response = client.get(f'/api/products/{lamps[0]}/similar?limit={limit}')
+    assert response.status_code == status
+    if status == 200:
+        assert len(response.get_json()['products']) <= 1
@@ -0,0 +1,59 @@
+"""Snapshot exports never share a directory"""
+import os
+from datetime import datetime
+
+import pytest
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, create_engine
+
+import snapshot_export
+
+
+@pytest.fixture
+def products(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'catalog.db'}")
+    metadata = MetaData()
+    table = Table(
+        'products', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('name', String(50)),
+        Column('updated_at', DateTime)
+    )
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(table.insert(), [{'name': 'Tea', 'updated_at': datetime.utcnow()}])
+    return engine, table
+
+
+def test_back_to_back_exports_get_their_own_directories(tmp_path, products):
+    engine, table = products
+    out_dir = str(tmp_path / 'exports')
+    full = snapshot_export.export_snapshot(engine, [table], out_dir, fmt='ndjson')
+    with engine.begin() as connection:
+        connection.execute(table.update().values(updated_at=datetime.utcnow()))
+    incremental = snapshot_export.export_snapshot(engine, [table], out_dir, incremental=True, fmt='ndjson')
+
+    assert full['directory'] != incremental['directory']
+    assert incremental['tables']['products']['rows'] == 1
+    for entry in (full, incremental):
+        assert os.listdir(os.path.join(out_dir, entry['directory'])) == ['products-00000.ndjson.gz']
+    manifest = snapshot_export.load_manifest(out_dir)
+    assert [entry['directory'] for entry in manifest['exports']] == [full['directory'], incremental['directory']]
+
+
+def test_existing_directory_is_not_reused(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tags.db'}")
+    metadata = MetaData()
+    table = Table('tags', metadata, Column('id', Integer, primary_key=True), Column('tag', String(50)))
+    metadata.create_all(engine)
+    moment = datetime(2026, 1, 1, 12, 0, 0, 123456)
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return moment
+
+    monkeypatch.setattr(snapshot_export, 'datetime', FrozenDatetime)
+    out_dir = str(tmp_path / 'exports')
+    snapshot_export.export_snapshot(engine, [table], out_dir, fmt='ndjson')
+    with pytest.raises(FileExistsError):
+        snapshot_export.export_snapshot(engine, [table], out_dir, fmt='ndjson')
@@ -0,0 +1,46 @@
+"""Tag validation and the tag_counts table kept beside the posting lists"""
+import pytest
+
+import tag_index
+
+
+def counts(backend, tags=('rare', 'common', 'other')):
+    with backend.app.app_context():
+        rows = backend.TagCount.query.filter(backend.TagCount.tag.in_(tags))
+        return {row.tag: row.product_count for row in rows if row.product_count}
+
+
+@pytest.mark.parametrize('tags', ['vegan', ['vegan', 3], ['x' * 51]], ids=['string', 'non-string', 'too-long'])
+def test_invalid_tags_are_rejected(client, owner_headers, shop, tags):
+    response = client.post('/api/products', headers=owner_headers, json={
+        'name': 'Bad', 'price': 1.0, 'category': 'food', 'shop_id': shop['id'], 'tags': tags
+    })
+    assert response.status_code == 400
+
+
+def test_over_long_tag_filter_is_rejected(client):
+    assert client.get('/api/products?tags=' + 'x' * 51).status_code == 400
+
+
+def test_counts_follow_inserts_updates_and_deletes(backend, client, owner_headers, shop):
+    ids = [
+        client.post('/api/products', headers=owner_headers, json={
+            'name': f'Item {index}', 'price': 1.0, 'category': 'food', 'shop_id': shop['id'], 'tags': tags
+        }).get_json()['product']['id']
+        for index, tags in enumerate([['Rare', 'common'], ['common'], ['common', 'other']])
+    ]
+    assert counts(backend) == {'rare': 1, 'common': 3, 'other': 1}
+
+    products = client.get('/api/products?tags=common,rare&tag_mode=all').get_json()['products']
+    assert [product['id'] for product in products] == [ids[0]]
+
+    with backend.app.app_context():
+        db = backend.db
+        db.session.get(backend.Product, ids[1]).tags = ['rare']
+        db.session.delete(db.session.get(backend.Product, ids[2]))
+        db.session.commit()
+    assert counts(backend) == {'rare': 2, 'common': 1}
+
+    with backend.app.app_context():
+        tag_index.rebuild(backend.db.session, backend.Product, backend.ProductTag, backend.TagCount)
+    assert counts(backend) == {'rare': 2, 'common': 1}